@@ -1,4 +1,19 @@
-from aiohttp_catcher.catcher import Catcher
-from aiohttp_catcher.scenario import catch, Scenario
+from aiohttp_catcher.breaker import CircuitBreaker
+from aiohttp_catcher.budget import ErrorBudget
+from aiohttp_catcher.catcher import Catcher, CatcherFrozenError
+from aiohttp_catcher.chains import ChainResolution
+from aiohttp_catcher.deadline import RenderDeadline
+from aiohttp_catcher.events import CallbackSink, ErrorEventExporter, EventSink, JsonLinesSink, UnixSocketSink
+from aiohttp_catcher.fields import exc_attr, header, match_info, query, req_method, req_path
+from aiohttp_catcher.metrics import Metrics, MetricsSink
+from aiohttp_catcher.registry import ScenarioRegistry
+from aiohttp_catcher.scenario import catch, FrozenScenario, Scenario
+from aiohttp_catcher.shared import SharedErrorStats
+from aiohttp_catcher.unhandled import UnhandledExceptionLogger
 
-__all__ = ["catch", "Catcher", "Scenario"]
+__all__ = [
+    "CallbackSink", "catch", "Catcher", "CatcherFrozenError", "ChainResolution", "CircuitBreaker", "ErrorBudget",
+    "ErrorEventExporter", "EventSink", "exc_attr", "FrozenScenario", "header", "JsonLinesSink", "match_info",
+    "Metrics", "MetricsSink", "query", "RenderDeadline", "req_method", "req_path", "Scenario", "ScenarioRegistry",
+    "SharedErrorStats", "UnhandledExceptionLogger", "UnixSocketSink",
+]
@@ -0,0 +1,54 @@
+from collections import deque
+from math import ceil
+from time import monotonic
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+from aiohttp.web import Request
+
+
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    # Counts the errors each scenario renders for each route over a sliding window. Once a route reaches
+    # ``threshold`` errors within ``window`` seconds, its requests are short-circuited - before their handler
+    # runs - for ``cooldown`` seconds.
+
+    def __init__(self, threshold: int = 50, window: float = 10.0, cooldown: float = 30.0, min_status: int = 500,
+                 status_code: int = 503, message: Any = "Service temporarily unavailable"):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.min_status = min_status
+        self.status_code = status_code
+        self.message = message
+        self._errors: Dict[Tuple[Hashable, str], Deque[float]] = {}
+        self._open: Dict[Hashable, float] = {}
+
+    def retry_after(self, request: Request) -> Optional[int]:
+        # The number of seconds until the request's route closes again, or None if it isn't open.
+        if not self._open:
+            return None
+        resource = request.match_info.route.resource
+        until = self._open.get(resource)
+        if until is None:
+            return None
+        remaining = until - monotonic()
+        if remaining <= 0:
+            del self._open[resource]
+            return None
+        return ceil(remaining)
+
+    def record(self, request: Request, scenario: str, status: int):
+        if status < self.min_status:
+            return
+        resource = request.match_info.route.resource
+        key = (resource, scenario)
+        errors = self._errors.get(key)
+        if errors is None:
+            errors = self._errors[key] = deque(maxlen=self.threshold)
+        now = monotonic()
+        errors.append(now)
+        if len(errors) == self.threshold and now - errors[0] <= self.window:
+            self._open[resource] = now + self.cooldown
+            errors.clear()
+
+    def is_open(self, request: Request) -> bool:
+        return self.retry_after(request) is not None
@@ -0,0 +1,131 @@
+from array import array
+from asyncio import get_running_loop, TimerHandle
+from math import ceil
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+import logging
+
+from aiohttp.web import Application, Request
+
+LOGGER = logging.getLogger(__name__)
+
+# Burn rate thresholds over one and six hours, alerting when 2% and 5% of a 30-day budget are spent in them.
+DEFAULT_WINDOWS = ((3600.0, 14.4), (21600.0, 6.0))
+
+BurnHook = Callable[[Optional[str], float, float, int, int], None]
+
+
+class RouteBudget:  # pylint: disable=too-few-public-methods
+    __slots__ = ("route", "totals", "errors", "burning")
+
+    def __init__(self, route: Optional[str], slots: int):
+        self.route = route
+        self.totals = array("L", bytes(array("L").itemsize * slots))
+        self.errors = array("L", bytes(array("L").itemsize * slots))
+        self.burning: Set[float] = set()
+
+    def counts(self, cursor: int, size: int) -> Tuple[int, int]:
+        # The errors and requests of the ``size`` slots up to the cursor's.
+        start = cursor - size + 1
+        if start >= 0:
+            return sum(self.errors[start:cursor + 1]), sum(self.totals[start:cursor + 1])
+        return sum(self.errors[start:]) + sum(self.errors[:cursor + 1]), \
+            sum(self.totals[start:]) + sum(self.totals[:cursor + 1])
+
+
+class ErrorBudget:  # pylint: disable=too-many-instance-attributes
+    # Tracks each route's error budget against an availability SLO. Requests and errors are counted in ring buffers
+    # of ``granularity``-second slots; a timer moves the cursor to the next slot, and checks each route's burn rate -
+    # the rate at which it spends its budget - over each window. Hooks are called when a route's burn rate reaches a
+    # window's threshold, once, until it drops below it again.
+
+    def __init__(self, slo: float = 0.999, windows: Sequence[Tuple[float, float]] = DEFAULT_WINDOWS,
+                 granularity: float = 60.0, min_requests: int = 100, min_status: int = 500):
+        self.slo = slo
+        self.granularity = granularity
+        self.windows = tuple((window, threshold, max(1, ceil(window / granularity))) for window, threshold in windows)
+        self.slots = max(size for _, _, size in self.windows)
+        self.min_requests = min_requests
+        self.min_status = min_status
+        self.cursor = 0
+        self._routes: Dict[Hashable, RouteBudget] = {}
+        self._hooks: List[BurnHook] = []
+        self._timer: Optional[TimerHandle] = None
+
+    def add_hook(self, hook: BurnHook):
+        # Hooks are called with the route, the window in seconds, its burn rate, and its error and request counts.
+        self._hooks.append(hook)
+
+    def record(self, request: Request, status: int):
+        # Counts a request - whether its response was returned by the handler or rendered by the catcher - and, if
+        # its status is ``min_status`` or above, an error.
+        resource = request.match_info.route.resource
+        budget = self._routes.get(resource)
+        if budget is None:
+            budget = self._add_route(resource)
+        budget.totals[self.cursor] += 1
+        if status >= self.min_status:
+            budget.errors[self.cursor] += 1
+
+    def _add_route(self, resource: Hashable) -> RouteBudget:
+        if self._timer is None:
+            self.start()
+        budget = self._routes[resource] = RouteBudget(resource.canonical if resource is not None else None,
+                                                      self.slots)
+        return budget
+
+    def burn_rate(self, errors: int, total: int) -> float:
+        if not total:
+            return 0.0
+        return (errors / total) / (1.0 - self.slo)
+
+    def snapshot(self) -> Dict[Optional[str], Dict[float, float]]:
+        # The burn rate of each route over each window.
+        cursor = self.cursor
+        return {
+            budget.route: {window: self.burn_rate(*budget.counts(cursor, size)) for window, _, size in self.windows}
+            for budget in self._routes.values()
+        }
+
+    def tick(self):
+        # Checks the burn rates over the slots up to the current one, then moves on to the next slot.
+        for budget in self._routes.values():
+            for window, threshold, size in self.windows:
+                errors, total = budget.counts(self.cursor, size)
+                burn_rate = self.burn_rate(errors, total)
+                if total >= self.min_requests and burn_rate >= threshold:
+                    if window not in budget.burning:
+                        budget.burning.add(window)
+                        self._fire(budget.route, window, burn_rate, errors, total)
+                else:
+                    budget.burning.discard(window)
+        cursor = (self.cursor + 1) % self.slots
+        for budget in self._routes.values():
+            budget.totals[cursor] = 0
+            budget.errors[cursor] = 0
+        self.cursor = cursor
+
+    def _fire(self, route: Optional[str], window: float, burn_rate: float, errors: int, total: int):
+        for hook in self._hooks:
+            try:
+                hook(route, window, burn_rate, errors, total)
+            except Exception:
+                LOGGER.exception("aiohttp-catcher's error budget hook failed")
+
+    def _on_timer(self):
+        self.tick()
+        self._timer = get_running_loop().call_later(self.granularity, self._on_timer)
+
+    def start(self):
+        if self._timer is None:
+            self._timer = get_running_loop().call_later(self.granularity, self._on_timer)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def on_startup(self, app: Application):  # pylint: disable=unused-argument
+        self.start()
+
+    async def on_cleanup(self, app: Application):  # pylint: disable=unused-argument
+        self.stop()
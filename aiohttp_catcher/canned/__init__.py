@@ -1,4 +1,11 @@
-from aiohttp_catcher.canned.aiohttp_errors import SCENARIOS as AIOHTTP_SCENARIOS
+from typing import Any
 
+__all__ = ["AIOHTTP_SCENARIO", "AIOHTTP_SCENARIOS"]  # pylint: disable=undefined-all-variable
 
-__all__ = ["AIOHTTP_SCENARIOS"]
+
+def __getattr__(name: str) -> Any:
+    # The canned scenarios are only loaded once they're used.
+    if name in __all__:
+        from aiohttp_catcher.canned import aiohttp_errors  # pylint: disable=import-outside-toplevel
+        return {"AIOHTTP_SCENARIO": aiohttp_errors.SCENARIO, "AIOHTTP_SCENARIOS": aiohttp_errors.SCENARIOS}[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,23 @@
-from typing import Optional
+from typing import Callable, Optional, Tuple
 
 from aiohttp.web import Request
-from aiohttp.web_exceptions import (
-    HTTPError, HTTPBadRequest, HTTPUnauthorized, HTTPPaymentRequired, HTTPForbidden, HTTPNotFound,
-    HTTPMethodNotAllowed, HTTPNotAcceptable, HTTPProxyAuthenticationRequired, HTTPRequestTimeout, HTTPConflict,
-    HTTPGone, HTTPLengthRequired, HTTPPreconditionFailed, HTTPRequestEntityTooLarge, HTTPRequestURITooLong,
-    HTTPUnsupportedMediaType, HTTPRequestRangeNotSatisfiable, HTTPExpectationFailed, HTTPMisdirectedRequest,
-    HTTPUnprocessableEntity, HTTPFailedDependency, HTTPUpgradeRequired, HTTPPreconditionRequired,
-    HTTPTooManyRequests, HTTPRequestHeaderFieldsTooLarge, HTTPUnavailableForLegalReasons, HTTPInternalServerError,
-    HTTPNotImplemented, HTTPBadGateway, HTTPServiceUnavailable, HTTPGatewayTimeout, HTTPVersionNotSupported,
-    HTTPVariantAlsoNegotiates, HTTPInsufficientStorage, HTTPNotExtended, HTTPNetworkAuthenticationRequired,
-)
+from aiohttp.web_exceptions import HTTPClientError, HTTPError, HTTPException, HTTPRedirection, HTTPServerError, \
+    HTTPSuccessful
 
-from aiohttp_catcher import catch
+from aiohttp_catcher import Scenario
+
+# The status codes of the exception families, for their base classes, which have none.
+FAMILY_STATUS_CODES = ((HTTPSuccessful, 200), (HTTPRedirection, 300), (HTTPClientError, 400), (HTTPServerError, 500))
+
+
+def get_status_code(exc_type: type) -> int:
+    status_code = getattr(exc_type, "status_code", -1)
+    if status_code > 0:
+        return status_code
+    for family, family_status_code in FAMILY_STATUS_CODES:
+        if issubclass(exc_type, family):
+            return family_status_code
+    return 500
 
 
 async def get_aiohttp_error_message(exc: HTTPError,
@@ -20,41 +25,40 @@ async def get_aiohttp_error_message(exc: HTTPError,
     return exc.__class__.__name__
 
 
-SCENARIOS = [
-    catch(HTTPBadRequest).with_status_code(400).and_call(get_aiohttp_error_message),
-    catch(HTTPUnauthorized).with_status_code(401).and_call(get_aiohttp_error_message),
-    catch(HTTPPaymentRequired).with_status_code(402).and_call(get_aiohttp_error_message),
-    catch(HTTPForbidden).with_status_code(403).and_call(get_aiohttp_error_message),
-    catch(HTTPNotFound).with_status_code(404).and_call(get_aiohttp_error_message),
-    catch(HTTPMethodNotAllowed).with_status_code(405).and_call(get_aiohttp_error_message),
-    catch(HTTPNotAcceptable).with_status_code(406).and_call(get_aiohttp_error_message),
-    catch(HTTPProxyAuthenticationRequired).with_status_code(407).and_call(get_aiohttp_error_message),
-    catch(HTTPRequestTimeout).with_status_code(408).and_call(get_aiohttp_error_message),
-    catch(HTTPConflict).with_status_code(409).and_call(get_aiohttp_error_message),
-    catch(HTTPGone).with_status_code(410).and_call(get_aiohttp_error_message),
-    catch(HTTPLengthRequired).with_status_code(411).and_call(get_aiohttp_error_message),
-    catch(HTTPPreconditionFailed).with_status_code(412).and_call(get_aiohttp_error_message),
-    catch(HTTPRequestEntityTooLarge).with_status_code(413).and_call(get_aiohttp_error_message),
-    catch(HTTPRequestURITooLong).with_status_code(414).and_call(get_aiohttp_error_message),
-    catch(HTTPUnsupportedMediaType).with_status_code(415).and_call(get_aiohttp_error_message),
-    catch(HTTPRequestRangeNotSatisfiable).with_status_code(416).and_call(get_aiohttp_error_message),
-    catch(HTTPExpectationFailed).with_status_code(417).and_call(get_aiohttp_error_message),
-    catch(HTTPMisdirectedRequest).with_status_code(421).and_call(get_aiohttp_error_message),
-    catch(HTTPUnprocessableEntity).with_status_code(422).and_call(get_aiohttp_error_message),
-    catch(HTTPFailedDependency).with_status_code(424).and_call(get_aiohttp_error_message),
-    catch(HTTPUpgradeRequired).with_status_code(426).and_call(get_aiohttp_error_message),
-    catch(HTTPPreconditionRequired).with_status_code(428).and_call(get_aiohttp_error_message),
-    catch(HTTPTooManyRequests).with_status_code(429).and_call(get_aiohttp_error_message),
-    catch(HTTPRequestHeaderFieldsTooLarge).with_status_code(431).and_call(get_aiohttp_error_message),
-    catch(HTTPUnavailableForLegalReasons).with_status_code(451).and_call(get_aiohttp_error_message),
-    catch(HTTPInternalServerError).with_status_code(500).and_call(get_aiohttp_error_message),
-    catch(HTTPNotImplemented).with_status_code(501).and_call(get_aiohttp_error_message),
-    catch(HTTPBadGateway).with_status_code(502).and_call(get_aiohttp_error_message),
-    catch(HTTPServiceUnavailable).with_status_code(503).and_call(get_aiohttp_error_message),
-    catch(HTTPGatewayTimeout).with_status_code(504).and_call(get_aiohttp_error_message),
-    catch(HTTPVersionNotSupported).with_status_code(505).and_call(get_aiohttp_error_message),
-    catch(HTTPVariantAlsoNegotiates).with_status_code(506).and_call(get_aiohttp_error_message),
-    catch(HTTPInsufficientStorage).with_status_code(507).and_call(get_aiohttp_error_message),
-    catch(HTTPNotExtended).with_status_code(510).and_call(get_aiohttp_error_message),
-    catch(HTTPNetworkAuthenticationRequired).with_status_code(511).and_call(get_aiohttp_error_message),
-]
+class SpecializedScenario(Scenario):
+    # The scenario of a single exception type, configured as the generic scenario is. Its callables are compiled
+    # by the generic scenario, so that every exception type shares its caches and executor slots.
+
+    def __init__(self, generic: "HTTPExceptionScenario", exc_type: type, status_code: int):
+        super().__init__(exceptions=[exc_type], constant=exc_type.__name__, status_code=status_code,
+                         additional_fields=generic.additional_fields)
+        self.generic = generic
+        if generic.func is not get_aiohttp_error_message:
+            self.and_call(generic.func)
+        self.conditions = generic.conditions
+        self.priority = generic.priority
+        self.reraise = generic.reraise or status_code < 400
+
+    def _compile_callable(self, func: Callable) -> Tuple[Callable, bool]:
+        return self.generic._compile_callable(func)  # pylint: disable=protected-access
+
+
+class HTTPExceptionScenario(Scenario):
+    # Handles all of aiohttp's web exceptions with a single scenario, dispatching on their status codes: each
+    # exception type is specialized once into a constant scenario, whose response body is encoded only once.
+    # Redirections and other non-error exceptions are re-raised, for aiohttp to respond with them as they are.
+    # The scenario's other builders apply to every exception type, but its status codes can't be overridden.
+
+    def __init__(self):
+        super().__init__(exceptions=[HTTPException], func=get_aiohttp_error_message)
+
+    def with_status_code(self, status_code) -> "Scenario":
+        raise TypeError("The status codes of aiohttp's web exceptions can't be overridden; register a scenario "
+                        "for the exception type instead")
+
+    def specialize(self, exc_type: type) -> Scenario:
+        return SpecializedScenario(self, exc_type, get_status_code(exc_type))
+
+
+SCENARIO = HTTPExceptionScenario()
+SCENARIOS = [SCENARIO]
@@ -1,69 +1,710 @@
-from typing import Callable, Dict, Union
+from asyncio import TimeoutError as AsyncTimeoutError, wait_for
+from http import HTTPStatus
+from time import perf_counter
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
 import json
 import logging
 
+from aiohttp import hdrs
 from aiohttp.typedefs import Handler
-from aiohttp.web import json_response, middleware, Request
+from aiohttp.web import AbstractResource, AbstractRoute, Application, middleware, Request, Response, StreamResponse
 
-from aiohttp_catcher.scenario import Scenario
+from aiohttp_catcher.breaker import CircuitBreaker
+from aiohttp_catcher.budget import ErrorBudget
+from aiohttp_catcher.chains import ChainResolution
+from aiohttp_catcher.deadline import RenderDeadline
+from aiohttp_catcher.events import ErrorEventExporter
+from aiohttp_catcher.fields import Field, Template
+from aiohttp_catcher.metrics import MetricsSink, PHASES
+from aiohttp_catcher.negotiation import negotiate
+from aiohttp_catcher.predicates import expand, register, ScenarioChain
+from aiohttp_catcher.registry import _full_class_name, ScenarioRegistry
+from aiohttp_catcher.scenario import BaseScenario, Scenario
+from aiohttp_catcher.streaming import DEFAULT_FRAMINGS, Framing, PREPARED_RESPONSE
+from aiohttp_catcher.unhandled import UnhandledExceptionLogger
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_MEDIA_TYPE = "application/json"
+NEGOTIATION_CACHE_SIZE = 256
+SERVER_TIMING = "Server-Timing"
+
+Renderer = Tuple[Callable, bool]
+Body = Tuple[bytes, Optional[str]]
+Scope = Union[AbstractResource, AbstractRoute, Application]
+PhaseHook = Callable[[str, float, Request], Any]
+ErrorCounter = Callable[[str, int], Any]
+
+
+class CatcherFrozenError(RuntimeError):
+    pass
+
+
+class CompiledScenario(NamedTuple):
+    renderers: Dict[str, Renderer]
+    get_message: Callable
+    message_is_async: bool
+    get_fields: Callable
+    fields_are_async: bool
+    bodies: Dict[str, Body]
+    status_code: int
+    label: str
+
+
+class Dispatch(NamedTuple):
+    # The catcher-wide scenarios along with the resolutions cached from them, published as a whole: requests read
+    # one consistent snapshot, without locking, while a new one is built and swapped in.
+    scenario_map: Mapping[str, BaseScenario]
+    resolution_cache: Dict[Any, Optional[BaseScenario]]
+    scope_layers: Dict[Any, Tuple[Mapping[str, BaseScenario], ...]]
+
+
+def encode(encoder: Callable, data: Any) -> Body:
+    # Encoders may return either bytes, which are used as they are, or text, which is encoded as UTF-8.
+    body = encoder(data)
+    if isinstance(body, str):
+        return body.encode("utf-8"), "utf-8"
+    return body, None
+
+
+async def _within(awaitable: Awaitable, until: Optional[float]) -> Any:
+    if until is None:
+        return await awaitable
+    return await wait_for(awaitable, until - perf_counter())
+
+
+def _timings(started: float, resolved: float, fields_done: float, message_done: float,
+             encoded: float) -> Dict[str, float]:
+    return {
+        "resolution": resolved - started,
+        "additional_fields": fields_done - resolved,
+        "message": message_done - fields_done,
+        "encoding": encoded - message_done,
+    }
+
 
 async def get_full_class_name(cls: type) -> str:
-    return f"{cls.__module__}.{cls.__name__}"
+    return _full_class_name(cls)
+
+
+def _scope_key(scope: Scope) -> Hashable:
+    if isinstance(scope, AbstractRoute):
+        return scope.resource
+    return scope
+
+
+def _split_template(items: Iterable[Tuple[str, Any]],
+                    get_message: Callable) -> Optional[Tuple[Tuple[Tuple[str, Callable], ...], str]]:
+    # Splits a JSON object into the serialized text preceding each of its dynamic values, with the callable
+    # extracting it, and the text following the last of them; None if a static value can't be serialized.
+    segments = []
+    text, separator = "{", ""
+    try:
+        for name, value in items:
+            text += separator + json.dumps(name) + ": "
+            separator = ", "
+            if value is get_message or isinstance(value, Field):
+                segments.append((text, get_message if value is get_message else value.extract))
+                text = ""
+            else:
+                text += json.dumps(value)
+    except (TypeError, ValueError):
+        return None
+    return tuple(segments), text + "}"
 
 
-class Catcher:
-    scenario_map: Dict = {}
+class Catcher:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     envelope: str
     code: str
+    frozen: bool = False
+    compile_time: Optional[float] = None
 
-    def __init__(self, envelope: str = "message", code: str = "code", encoder: Callable = json.dumps):
+    def __init__(self, envelope: str = "message", code: str = "code", encoder: Callable = json.dumps,
+                 unhandled_logger: Optional[UnhandledExceptionLogger] = None,
+                 encoders: Optional[Dict[str, Callable]] = None, registry: Optional[ScenarioRegistry] = None):
         self.envelope = envelope
         self.code = code
         self.encoder = encoder
+        # Encoders by media type, negotiated against the request's Accept header; JSON is the default.
+        self.encoders = {DEFAULT_MEDIA_TYPE: encoder, **(encoders or {})}
+        self.unhandled_logger = unhandled_logger or UnhandledExceptionLogger()
+        # Optional collaborators, attached with the use_*() methods rather than passed to the constructor:
+        self.metrics: Optional[MetricsSink] = None
+        self.chain_resolution: Optional[ChainResolution] = None
+        self.exporter: Optional[ErrorEventExporter] = None
+        self.server_timing = False
+        self.breaker: Optional[CircuitBreaker] = None
+        self.budget: Optional[ErrorBudget] = None
+        self.deadline: Optional[RenderDeadline] = None
+        # In-band error record framings by the content type of streamed responses.
+        self.stream_framings: Dict[str, Framing] = dict(DEFAULT_FRAMINGS)
+        self._minimal_bodies: Dict[Tuple[int, str], Body] = {}
+        self._phase_hooks: Dict[str, List[PhaseHook]] = {}
+        self._error_counters: List[ErrorCounter] = []
+        self._dispatch = Dispatch({}, {}, {})
+        self._shared_scenario_map = False
+        self._overrides: Dict[Hashable, Dict[str, BaseScenario]] = {}
+        self._negotiated: Dict[str, str] = {}
+        self._renderers: Dict[BaseScenario, CompiledScenario] = {}
+        self._default_scenario = Scenario(exceptions=[Exception])
+        self._compile(self._default_scenario)
+        self._shed: Optional[CompiledScenario] = None
+        if registry is not None:
+            self.use_registry(registry)
+
+    def _check_not_frozen(self):
+        if self.frozen:
+            raise CatcherFrozenError("Catchers cannot be configured after they have been frozen")
+
+    def use_metrics(self, metrics: MetricsSink) -> "Catcher":
+        self._check_not_frozen()
+        self.metrics = metrics
+        return self
+
+    def use_exporter(self, exporter: ErrorEventExporter) -> "Catcher":
+        self._check_not_frozen()
+        self.exporter = exporter
+        return self
+
+    def add_error_counter(self, counter: ErrorCounter) -> "Catcher":
+        # Counters are called with the scenario's label and the status code of every error the catcher renders.
+        # Unlike metrics sinks, they don't have the error path timed phase by phase.
+        self._check_not_frozen()
+        self._error_counters.append(counter)
+        return self
+
+    def use_server_timing(self, enabled: bool = True) -> "Catcher":
+        self._check_not_frozen()
+        self.server_timing = enabled
+        return self
+
+    def use_chain_resolution(self, chain_resolution: ChainResolution) -> "Catcher":
+        self._check_not_frozen()
+        self.chain_resolution = chain_resolution
+        self._clear_caches()
+        return self
+
+    def use_breaker(self, breaker: CircuitBreaker) -> "Catcher":
+        self._check_not_frozen()
+        self.breaker = breaker
+        self._shed = self._compile(Scenario(exceptions=[], constant=breaker.message, status_code=breaker.status_code))
+        return self
+
+    def use_budget(self, budget: ErrorBudget) -> "Catcher":
+        self._check_not_frozen()
+        self.budget = budget
+        return self
+
+    def use_deadline(self, deadline: RenderDeadline) -> "Catcher":
+        self._check_not_frozen()
+        self.deadline = deadline
+        return self
+
+    def add_stream_framing(self, content_type: str, framing: Framing) -> "Catcher":
+        self._check_not_frozen()
+        self.stream_framings[content_type] = framing
+        return self
+
+    def use_registry(self, registry: ScenarioRegistry) -> "Catcher":
+        # Replaces the catcher-wide scenarios with the registry's. The registry's scenario map is shared rather
+        # than copied - until a scenario is registered - and its scenarios are only compiled once they're used.
+        if self.frozen:
+            raise CatcherFrozenError("Scenarios cannot be registered after the catcher has been frozen")
+        self._shared_scenario_map = True
+        self._publish(registry.scenario_map)
+        return self
+
+    def reload(self, scenarios: Union[ScenarioRegistry, Iterable[Union[BaseScenario, Dict]]]) -> float:
+        # Replaces every catcher-wide scenario at once - scoped scenarios are kept. The new scenarios are built and
+        # compiled aside, then published with a single swap, so requests are never handled by a partial set of
+        # scenarios, nor stall on a cold cache. Frozen catchers can be reloaded, too; they stay frozen. Returns the
+        # time it took, in seconds.
+        started = perf_counter()
+        registry = scenarios if isinstance(scenarios, ScenarioRegistry) else ScenarioRegistry.build(scenarios)
+        scenario_map = registry.scenario_map
+        kept = [self._default_scenario, *self._scoped_scenarios()]
+        renderers = {scenario: self._renderers[scenario] for scenario in kept if scenario in self._renderers}
+        for entry in scenario_map.values():
+            for scenario in expand(entry):
+                if scenario not in renderers:
+                    self._compile(scenario, into=renderers)
+        self._renderers = renderers
+        self._shared_scenario_map = True
+        self._publish(scenario_map)
+        elapsed = perf_counter() - started
+        LOGGER.debug("aiohttp-catcher reloaded %d scenarios in %.3fms", len(registry), elapsed * 1000)
+        return elapsed
+
+    @property
+    def scenario_map(self) -> Mapping[str, BaseScenario]:
+        return self._dispatch.scenario_map
+
+    def _publish(self, scenario_map: Mapping[str, BaseScenario]):
+        self._dispatch = Dispatch(scenario_map, {}, {})
+        if self.chain_resolution is not None:
+            self.chain_resolution.clear()
+
+    def _clear_caches(self):
+        self._publish(self.scenario_map)
+
+    def _scoped_scenarios(self) -> List[BaseScenario]:
+        return [scenario for overrides in self._overrides.values() for entry in overrides.values()
+                for scenario in expand(entry)]
+
+    def add_phase_hook(self, phase: str, hook: PhaseHook) -> "Catcher":
+        # Hooks are called with the scenario's label, the phase's duration in seconds and the request, once the
+        # error response has been rendered.
+        self._check_not_frozen()
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase {phase!r}; expected one of {PHASES}")
+        self._phase_hooks.setdefault(phase, []).append(hook)
+        return self
 
-    async def add_scenario(self, scenario: Union[Scenario, Dict]):
+    @property
+    def instrumented(self) -> bool:
+        return self.metrics is not None or self.exporter is not None or self.server_timing or bool(self._phase_hooks)
+
+    def _observe(self, exc: Exception, request: Request, response: StreamResponse, compiled: CompiledScenario,
+                 timings: Dict[str, float]):
+        label, status = compiled.label, compiled.status_code
+        if self.metrics is not None:
+            self.metrics.observe(label, status, timings)
+        if self.exporter is not None:
+            self.exporter.emit(exc, request, label, status, timings)
+        for phase, hooks in self._phase_hooks.items():
+            for hook in hooks:
+                try:
+                    hook(label, timings[phase], request)
+                except Exception:
+                    LOGGER.exception("aiohttp-catcher's %s phase hook failed", phase)
+        # Streamed responses have sent their headers already:
+        if self.server_timing and not response.prepared:
+            response.headers[SERVER_TIMING] = ", ".join(f"{phase};dur={duration * 1000:.3f}"
+                                                        for phase, duration in timings.items())
+
+    def _encode_static_bodies(self, scenario: BaseScenario) -> Dict[str, Body]:
+        # Scenarios that render the same payload for every exception are encoded once per media type, at
+        # registration time.
+        if not scenario.is_static:
+            return {}
+        data = {
+            self.envelope: scenario.constant,
+            self.code: scenario.status_code,
+            **(scenario.additional_fields or {})
+        }
+        bodies = {}
+        for media_type, encoder in self.encoders.items():
+            try:
+                bodies[media_type] = encode(encoder, data)
+            except Exception:
+                LOGGER.debug("Could not pre-encode the %s response body of a static scenario; it will be encoded "
+                             "per request", media_type)
+        return bodies
+
+    def _compile(self, scenario: BaseScenario,
+                 into: Optional[Dict[BaseScenario, CompiledScenario]] = None) -> CompiledScenario:
+        status_code = scenario.status_code
+        bodies = self._encode_static_bodies(scenario)
+        get_message, message_is_async = scenario.compile_response_message()
+        get_fields, fields_are_async = scenario.compile_additional_fields()
+        renderers = {}
+        for media_type, encoder in self.encoders.items():
+            renderer = None
+            if media_type in bodies:
+                renderer = self._compile_static(status_code, media_type, bodies[media_type])
+            elif isinstance(get_fields, Template) and encoder is json.dumps and not message_is_async:
+                renderer = self._compile_template(scenario, media_type, get_message, get_fields)
+            if renderer is None:
+                renderer = self._compile_dynamic(status_code, media_type, encoder, (get_message, message_is_async),
+                                                 (get_fields, fields_are_async))
+            renderers[media_type] = renderer
+        compiled = CompiledScenario(renderers=renderers, get_message=get_message, message_is_async=message_is_async,
+                                    get_fields=get_fields, fields_are_async=fields_are_async, bodies=bodies,
+                                    status_code=status_code, label=self._label(scenario))
+        (self._renderers if into is None else into)[scenario] = compiled
+        return compiled
+
+    def _label(self, scenario: BaseScenario) -> str:
+        if scenario is self._default_scenario:
+            return "unhandled"
+        label = ",".join(_full_class_name(exc) for exc in scenario.exceptions)
+        if scenario.conditions:
+            label += "[" + ",".join(f"{name}={condition!r}" for name, condition in scenario.conditions.items()) + "]"
+        return label
+
+    @staticmethod
+    def _compile_static(status_code: int, media_type: str, body: Body) -> Renderer:
+        body, charset = body
+
+        def render_static(exc: Exception, request: Request) -> Response:  # pylint: disable=unused-argument
+            return Response(body=body, status=status_code, content_type=media_type, charset=charset)
+        return render_static, False
+
+    def _compile_template(self, scenario: BaseScenario, media_type: str, get_message: Callable,
+                          template: Template) -> Optional[Renderer]:
+        # JSON bodies of scenarios with additional fields templates are serialized ahead of time, but for their
+        # dynamic values - the templated fields, and the message unless it's a constant - which are encoded in
+        # place once they're extracted. Returns None if the body can't be split this way - if the template overrides
+        # the envelope or the code, or has keys json.dumps() would coerce to strings.
+        envelope, code, status_code = self.envelope, self.code, scenario.status_code
+        if envelope in template.fields or code in template.fields or \
+                not all(isinstance(name, str) for name in template.fields):
+            return None
+        message = get_message if scenario.is_callable or scenario.stringify_exception else scenario.constant
+        split = _split_template(((envelope, message), (code, status_code), *template.fields.items()), get_message)
+        if split is None:
+            return None
+        segments, tail = split
+        dumps = json.dumps
+
+        def render_template(exc: Exception, request: Request) -> Response:
+            chunks = []
+            for preceding, extract in segments:
+                chunks.append(preceding)
+                chunks.append(dumps(extract(exc, request)))
+            chunks.append(tail)
+            return Response(body="".join(chunks).encode("utf-8"), status=status_code, content_type=media_type,
+                            charset="utf-8")
+        return render_template, False
+
+    def _compile_dynamic(self, status_code: int, media_type: str, encoder: Callable, message: Tuple[Callable, bool],
+                         fields: Tuple[Callable, bool]) -> Renderer:
+        # The message and additional fields are compiled callables, each with whether it's async.
+        envelope, code = self.envelope, self.code
+        (get_message, message_is_async), (get_fields, fields_are_async) = message, fields
+
+        if not message_is_async and not fields_are_async:
+            def render(exc: Exception, request: Request) -> Response:
+                additional_fields = get_fields(exc, request)
+                data = {envelope: get_message(exc, request), code: status_code, **additional_fields}
+                body, charset = encode(encoder, data)
+                return Response(body=body, status=status_code, content_type=media_type, charset=charset)
+            return render, False
+
+        async def render_async(exc: Exception, request: Request) -> Response:
+            additional_fields = get_fields(exc, request)
+            if fields_are_async:
+                additional_fields = await additional_fields
+            message = get_message(exc, request)
+            if message_is_async:
+                message = await message
+            data = {envelope: message, code: status_code, **additional_fields}
+            body, charset = encode(encoder, data)
+            return Response(body=body, status=status_code, content_type=media_type, charset=charset)
+        return render_async, True
+
+    def _negotiate(self, request: Request) -> str:
+        # The encoder picked for each distinct Accept header is cached; unacceptable requests get the default.
+        if len(self.encoders) == 1:
+            return DEFAULT_MEDIA_TYPE
+        accept = request.headers.get(hdrs.ACCEPT)
+        if not accept:
+            return DEFAULT_MEDIA_TYPE
+        media_type = self._negotiated.get(accept)
+        if media_type is None:
+            if len(self._negotiated) >= NEGOTIATION_CACHE_SIZE:
+                self._negotiated.clear()
+            media_type = negotiate(accept, tuple(self.encoders)) or DEFAULT_MEDIA_TYPE
+            self._negotiated[accept] = media_type
+        return media_type
+
+    def _shed_response(self, request: Request, retry_after: int) -> Response:
+        media_type = self._negotiate(request)
+        body, charset = self._shed.bodies[media_type]
+        return Response(body=body, status=self._shed.status_code, content_type=media_type, charset=charset,
+                        headers={hdrs.RETRY_AFTER: str(retry_after)})
+
+    def _minimal_response(self, compiled: CompiledScenario, media_type: str) -> Response:
+        # The scenario's status code, with its reason phrase for a message; encoded once per status code.
+        status_code = compiled.status_code
+        body = compiled.bodies.get(media_type) or self._minimal_bodies.get((status_code, media_type))
+        if body is None:
+            try:
+                phrase = HTTPStatus(status_code).phrase
+            except ValueError:
+                phrase = str(status_code)
+            body = encode(self.encoders[media_type], {self.envelope: phrase, self.code: status_code})
+            self._minimal_bodies[(status_code, media_type)] = body
+        body, charset = body
+        return Response(body=body, status=status_code, content_type=media_type, charset=charset)
+
+    async def _render_before_deadline(self, compiled: CompiledScenario, exc: BaseException,
+                                      request: Request) -> Response:
+        media_type = self._negotiate(request)
+        render, is_coroutine = compiled.renderers[media_type]
+        if media_type in compiled.bodies:
+            return render(exc, request)
+        remaining = self.deadline.remaining(request)
+        if remaining is not None and remaining <= 0:
+            return self._minimal_response(compiled, media_type)
+        response = render(exc, request)
+        if not is_coroutine:
+            return response
+        if remaining is None:
+            return await response
+        try:
+            return await wait_for(response, remaining)
+        except AsyncTimeoutError:
+            LOGGER.debug("aiohttp-catcher timed out rendering the response of %s after %.3fs", compiled.label,
+                         remaining)
+            return self._minimal_response(compiled, media_type)
+
+    def _select(self, exc: Exception, request: Request) -> Tuple[CompiledScenario, BaseException]:
+        # The compiled scenario handling the exception, and the exception it matched - a cause, a context or an
+        # exception group member, with chain resolution. Unhandled exceptions are logged, and re-raised scenarios'
+        # exceptions are re-raised.
+        scenario, matched = self.resolve_exception(exc, request)
+        if scenario is None:
+            self.unhandled_logger.log(exc)
+            scenario = self._default_scenario
+        elif scenario.reraise:
+            raise exc
+        return self._renderers.get(scenario) or self._compile(scenario), matched
+
+    async def _render(self, exc: Exception, request: Request) -> Tuple[Response, CompiledScenario]:
+        # The error path, for when its timings aren't being observed.
+        compiled, matched = self._select(exc, request)
+        if self.deadline is not None:
+            return await self._render_before_deadline(compiled, matched, request), compiled
+        render, is_coroutine = compiled.renderers[self._negotiate(request)]
+        response = render(matched, request)
+        if is_coroutine:
+            response = await response
+        return response, compiled
+
+    async def _render_instrumented(self, exc: Exception,
+                                   request: Request) -> Tuple[Response, CompiledScenario, Dict[str, float]]:
+        # The error path, phase by phase, for when its timings are being observed or exported.
+        started = perf_counter()
+        compiled, matched = self._select(exc, request)
+        resolved = perf_counter()
+        media_type = self._negotiate(request)
+        body = None
+        fields_done = message_done = perf_counter()
+        if media_type not in compiled.bodies:
+            remaining = None if self.deadline is None else self.deadline.remaining(request)
+            if remaining is None or remaining > 0:
+                body, fields_done, message_done = await self._render_body(
+                    compiled, matched, request, media_type, None if remaining is None else resolved + remaining
+                )
+        if body is None:
+            # Static bodies, and responses downgraded past the deadline:
+            response = self._minimal_response(compiled, media_type)
+        else:
+            response = Response(body=body[0], status=compiled.status_code, content_type=media_type, charset=body[1])
+        return response, compiled, _timings(started, resolved, fields_done, message_done, perf_counter())
+
+    async def _render_body(self, compiled: CompiledScenario, exc: BaseException, request: Request, media_type: str,
+                           until: Optional[float]) -> Tuple[Optional[Body], float, float]:
+        # Renders the additional fields, then the message, before ``until``; returns the encoded body - None if it
+        # timed out - and the times the fields and the message were done at.
+        try:
+            additional_fields = compiled.get_fields(exc, request)
+            if compiled.fields_are_async:
+                additional_fields = await _within(additional_fields, until)
+            fields_done = perf_counter()
+            message = compiled.get_message(exc, request)
+            if compiled.message_is_async:
+                message = await _within(message, until)
+            message_done = perf_counter()
+        except AsyncTimeoutError:
+            fields_done = message_done = perf_counter()
+            return None, fields_done, message_done
+        data = {self.envelope: message, self.code: compiled.status_code, **additional_fields}
+        return encode(self.encoders[media_type], data), fields_done, message_done
+
+    async def _end_stream(self, stream: StreamResponse, exc: Exception, request: Request) -> StreamResponse:
+        # Once a streamed response has been prepared, its status and headers are sent: the scenario's payload is
+        # written to the stream as a final record instead, framed as per the stream's content type, and the stream is
+        # ended. Streams of other content types are left for aiohttp to abort.
+        framing = self.stream_framings.get(stream.content_type)
+        if framing is None:
+            raise exc
+        started = perf_counter()
+        compiled, matched = self._select(exc, request)
+        resolved = fields_done = message_done = perf_counter()
+        record = compiled.bodies.get(DEFAULT_MEDIA_TYPE)
+        if record is None:
+            record, fields_done, message_done = await self._render_body(compiled, matched, request,
+                                                                        DEFAULT_MEDIA_TYPE, None)
+        encoded = perf_counter()
+        try:
+            await stream.write(framing(record[0]))
+            await stream.write_eof()
+        except ConnectionError:
+            LOGGER.debug("aiohttp-catcher could not write the error record of %s to a closed stream", compiled.label)
+        if self.instrumented:
+            self._observe(exc, request, stream, compiled, _timings(started, resolved, fields_done, message_done,
+                                                                   encoded))
+        self._account(request, compiled, compiled.status_code)
+        return stream
+
+    def _account(self, request: Request, compiled: CompiledScenario, status: int):
+        # Counts a rendered error against the breaker, the budget and the error counters.
+        if self.breaker is not None:
+            self.breaker.record(request, compiled.label, status)
+        if self.budget is not None:
+            self.budget.record(request, status)
+        for count in self._error_counters:
+            count(compiled.label, status)
+
+    @staticmethod
+    async def on_response_prepare(request: Request, response: StreamResponse):
+        # Keeps track of the request's response once it's prepared, so that errors raised while it's being streamed
+        # can be sent in-band.
+        request[PREPARED_RESPONSE] = response
+
+    async def add_scenario(self, scenario: Union[BaseScenario, Dict], scope: Optional[Scope] = None):
+        # Scenarios registered with a scope - a route, a resource or a sub-application - only apply to requests
+        # matched within that scope, and take precedence over the catcher-wide scenarios.
+        if self.frozen:
+            raise CatcherFrozenError("Scenarios cannot be registered after the catcher has been frozen")
         if isinstance(scenario, Dict):
             scenario = Scenario(**scenario)
 
+        if scope is None:
+            if self._shared_scenario_map:
+                self._publish(dict(self.scenario_map))
+                self._shared_scenario_map = False
+            scenario_map = self.scenario_map
+        else:
+            scenario_map = self._overrides.setdefault(_scope_key(scope), {})
         exceptions = scenario.exceptions
         for exc in exceptions:
-            exc_module = await get_full_class_name(exc)
-            if exc_module in self.scenario_map:
+            exc_module = _full_class_name(exc)
+            if register(scenario_map, exc_module, scenario):
                 LOGGER.debug("A new handler for <%s> has been registered. It will override existing handlers",
                              exc_module)
-            self.scenario_map[exc_module] = scenario
+        self._clear_caches()
+        self._compile(scenario)
 
-    async def add_scenarios(self, *scenarios: Union[Scenario, Dict]):
+    async def add_scenarios(self, *scenarios: Union[BaseScenario, Dict], scope: Optional[Scope] = None):
         for scenario in scenarios:
-            await self.add_scenario(scenario)
+            await self.add_scenario(scenario, scope=scope)
+
+    def freeze(self) -> float:
+        # Compile every registered scenario into an immutable dispatch table owned by this instance. Returns
+        # the compile cost in seconds, which is also kept in ``compile_time``.
+        if self.frozen:
+            return self.compile_time
+        started = perf_counter()
+        scenarios = [self._default_scenario]
+        for scenario_map in (self.scenario_map, *self._overrides.values()):
+            for entry in scenario_map.values():
+                scenarios.extend(expand(entry))
+        self._renderers = {}
+        for scenario in {id(s): s for s in scenarios}.values():
+            self._compile(scenario)
+        self._publish(MappingProxyType(self.scenario_map))
+        self._overrides = MappingProxyType({key: MappingProxyType(o) for key, o in self._overrides.items()})
+        self.frozen = True
+        self.compile_time = perf_counter() - started
+        LOGGER.debug("aiohttp-catcher compiled %d scenarios in %.3fms", len(self._renderers),
+                     self.compile_time * 1000)
+        return self.compile_time
+
+    async def on_startup(self, app: Application):  # pylint: disable=unused-argument
+        self.freeze()
+
+    @property
+    def has_scopes(self) -> bool:
+        return bool(self._overrides)
+
+    def scope_of(self, request: Request) -> Hashable:
+        resource = request.match_info.route.resource
+        return resource if resource is not None else request.match_info.apps
+
+    def _layers(self, request: Request,
+                dispatch: Dispatch) -> Tuple[Hashable, Tuple[Mapping[str, BaseScenario], ...]]:
+        # Scenario maps, from the most specific scope to the catcher-wide one: the matched resource, then the
+        # (sub-)applications it belongs to, innermost first. Computed once per scope.
+        match_info = request.match_info
+        resource = match_info.route.resource
+        scope = self.scope_of(request)
+        layers = dispatch.scope_layers.get(scope)
+        if layers is None:
+            overrides = [self._overrides.get(key) for key in (resource, *reversed(match_info.apps)) if key is not None]
+            layers = dispatch.scope_layers[scope] = (*(o for o in overrides if o), dispatch.scenario_map)
+        return scope, layers
+
+    def resolve(self, exc_type: type, request: Optional[Request] = None) -> Optional[BaseScenario]:
+        # Walk the MRO to the nearest registered ancestor once per exception type (and scope, if any scoped
+        # scenarios were registered); subsequent lookups are a single dict hit. The caches are dropped whenever a
+        # scenario is registered.
+        dispatch = self._dispatch
+        if self._overrides and request is not None:
+            scope, layers = self._layers(request, dispatch)
+            key = (scope, exc_type)
+        else:
+            layers = (dispatch.scenario_map,)
+            key = exc_type
+        try:
+            return dispatch.resolution_cache[key]
+        except KeyError:
+            pass
+        # Conditional scenarios can only be selected once the exception itself is known: exception types they may
+        # apply to resolve to a chain of candidates, down to the first unconditional scenario.
+        entries = []
+        resolved = False
+        for scenario_map in layers:
+            for klass in exc_type.__mro__:
+                entry = scenario_map.get(_full_class_name(klass))
+                if entry is None:
+                    continue
+                entries.append(entry.specialize(exc_type))
+                resolved = not entry.is_index or entry.fallback is not None
+                if resolved:
+                    break
+            if resolved:
+                break
+        if not entries:
+            scenario = None
+        elif len(entries) == 1 and not entries[0].is_index:
+            scenario = entries[0]
+        else:
+            scenario = ScenarioChain(tuple(entries))
+        dispatch.resolution_cache[key] = scenario
+        return scenario
+
+    def resolve_exception(self, exc: BaseException,
+                          request: Optional[Request] = None) -> Tuple[Optional[BaseScenario], BaseException]:
+        # The scenario handling the exception, along with the exception it applies to: the exception itself, or -
+        # with chain resolution - one of its causes or exception group members.
+        if self.chain_resolution is not None:
+            return self.chain_resolution.resolve(self, exc, request)
+        scenario = self.resolve(exc.__class__, request)
+        if scenario is not None and scenario.is_index:
+            scenario = scenario.select(exc)
+        return scenario, exc
 
     @property
     def middleware(self) -> Callable:
 
         @middleware
         async def catcher_middleware(request: Request, handler: Handler):
+            breaker, budget = self.breaker, self.budget
+            if breaker is not None:
+                retry_after = breaker.retry_after(request)
+                if retry_after is not None:
+                    response = self._shed_response(request, retry_after)
+                    if budget is not None:
+                        budget.record(request, response.status)
+                    return response
             try:
-                return await handler(request)
+                response = await handler(request)
             except Exception as exc:
-                exc_module = await get_full_class_name(exc.__class__)
-                scenario: Scenario
-                if exc_module in self.scenario_map:
-                    scenario = self.scenario_map[exc_module]
+                stream = request.get(PREPARED_RESPONSE)
+                if stream is not None and stream.prepared:
+                    return await self._end_stream(stream, exc, request)
+                if not self.instrumented:
+                    response, compiled = await self._render(exc, request)
                 else:
-                    LOGGER.exception("aiohttp-catcher caught an unhandled exception")
-                    scenario = Scenario(exceptions=[type(exc)])
-                additional_fields: Dict = await scenario.get_additional_fields(exc=exc, req=request)
-                data = {
-                    self.envelope: await scenario.get_response_message(exc=exc, request=request),
-                    self.code: scenario.status_code,
-                    **additional_fields
-                }
-                return json_response(
-                    data=data,
-                    status=scenario.status_code,
-                    dumps=self.encoder
-                )
+                    response, compiled, timings = await self._render_instrumented(exc, request)
+                    self._observe(exc, request, response, compiled, timings)
+                self._account(request, compiled, response.status)
+                return response
+            if budget is not None:
+                budget.record(request, response.status)
+            return response
         return catcher_middleware
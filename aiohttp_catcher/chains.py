@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional, Tuple
+import builtins
+
+from aiohttp.web import Request
+
+# BaseExceptionGroup, on Python 3.11 and later:
+_EXCEPTION_GROUPS = tuple(getattr(builtins, name) for name in ("BaseExceptionGroup",) if hasattr(builtins, name))
+
+CACHE_SIZE = 1024
+
+
+def walk(exc: BaseException, max_depth: int, max_nodes: int) -> List[BaseException]:
+    # The exception, then - breadth first - the members of exception groups and the exceptions they were raised
+    # from or while handling, up to ``max_depth`` levels deep and ``max_nodes`` exceptions overall.
+    nodes = [exc]
+    seen = {id(exc)}
+    level = [exc]
+    for _ in range(max_depth):
+        next_level = []
+        for node in level:
+            children = []
+            if isinstance(node, _EXCEPTION_GROUPS):
+                children.extend(node.exceptions)
+            if node.__cause__ is not None:
+                children.append(node.__cause__)
+            elif node.__context__ is not None and not node.__suppress_context__:
+                children.append(node.__context__)
+            for child in children:
+                if id(child) in seen:
+                    continue
+                if len(nodes) >= max_nodes:
+                    return nodes
+                seen.add(id(child))
+                nodes.append(child)
+                next_level.append(child)
+        if not next_level:
+            break
+        level = next_level
+    return nodes
+
+
+class ChainResolution:
+    # Resolves exceptions against their causes, contexts and exception group members as well: the scenario with
+    # the highest priority among all those matching wins, and ties go to the outermost exception. Candidates are
+    # cached by the shape of the chain - the types of its exceptions, in walk order.
+
+    def __init__(self, max_depth: int = 4, max_nodes: int = 32):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self._candidates: Dict[Any, Tuple[Tuple[int, Any], ...]] = {}
+
+    def clear(self):
+        self._candidates = {}
+
+    def resolve(self, catcher: Any, exc: BaseException,
+                request: Optional[Request] = None) -> Tuple[Optional[Any], BaseException]:
+        nodes = walk(exc, self.max_depth, self.max_nodes)
+        shape = tuple(node.__class__ for node in nodes)
+        if catcher.has_scopes and request is not None:
+            key = (catcher.scope_of(request), shape)
+        else:
+            key = shape
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            resolved = [(position, catcher.resolve(exc_type, request)) for position, exc_type in enumerate(shape)]
+            candidates = tuple(sorted(((position, scenario) for position, scenario in resolved if scenario),
+                                      key=lambda candidate: (-candidate[1].priority, candidate[0])))
+            if len(self._candidates) >= CACHE_SIZE:
+                self._candidates.clear()
+            self._candidates[key] = candidates
+        # Candidates are ordered by the highest priority they may select, so that ranking stops as soon as none
+        # of those left may beat the best selected so far:
+        best, best_rank = None, None
+        for position, scenario in candidates:
+            if best_rank is not None and (scenario.priority, -position) < best_rank:
+                break
+            if scenario.is_index:
+                scenario = scenario.select(nodes[position])
+                if scenario is None:
+                    continue
+            rank = (scenario.priority, -position)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (scenario, nodes[position]), rank
+        if best is None:
+            return None, exc
+        return best
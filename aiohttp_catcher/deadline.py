@@ -0,0 +1,37 @@
+from time import time
+from typing import Optional
+
+from aiohttp.web import Request
+
+DEFAULT_HEADER = "X-Request-Deadline"
+
+
+class RenderDeadline:  # pylint: disable=too-few-public-methods
+    # Bounds the time spent rendering error responses. Responses are downgraded to a minimal, pre-encoded body
+    # rather than rendered once the client has disconnected, or once the deadline propagated by the request's
+    # ``header`` - a Unix timestamp, in seconds - has passed; async callables that run past the deadline, or past
+    # ``timeout`` seconds, are cancelled and the minimal body is sent instead.
+
+    def __init__(self, header: Optional[str] = DEFAULT_HEADER, timeout: Optional[float] = None,
+                 skip_disconnected: bool = True):
+        self.header = header
+        self.timeout = timeout
+        self.skip_disconnected = skip_disconnected
+
+    def remaining(self, request: Request) -> Optional[float]:
+        # The seconds left to render the request's error response, or None if there's no limit.
+        if self.skip_disconnected:
+            transport = request.transport
+            if transport is None or transport.is_closing():
+                return 0.0
+        remaining = self.timeout
+        if self.header is not None:
+            value = request.headers.get(self.header)
+            if value is not None:
+                try:
+                    left = float(value) - time()
+                except ValueError:
+                    return remaining
+                if remaining is None or left < remaining:
+                    remaining = left
+        return remaining
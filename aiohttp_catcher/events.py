@@ -0,0 +1,219 @@
+from asyncio import CancelledError, get_running_loop, open_unix_connection, Queue, QueueEmpty, QueueFull, sleep, \
+    StreamWriter, Task
+from concurrent.futures import Executor
+from inspect import isawaitable
+from random import random
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import json
+import logging
+
+from aiohttp.web import Application, Request
+
+from aiohttp_catcher.registry import _full_class_name
+
+LOGGER = logging.getLogger(__name__)
+
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+OVERFLOW_POLICIES = (DROP_NEWEST, DROP_OLDEST)
+
+ErrorEvent = Dict[str, Any]
+
+_STOP = object()
+
+
+def snapshot(exc: BaseException, max_frames: int = 32) -> Dict[str, Any]:
+    # The exception's type, message and innermost frames as plain data, so that neither the frames nor anything
+    # they reference - the request included - outlive the request.
+    frames = []
+    trace = exc.__traceback__
+    while trace is not None:
+        code = trace.tb_frame.f_code
+        frames.append({"file": code.co_filename, "line": trace.tb_lineno, "function": code.co_name})
+        trace = trace.tb_next
+    return {"type": _full_class_name(type(exc)), "message": str(exc), "frames": frames[-max_frames:]}
+
+
+def error_event(exc: BaseException, request: Request, scenario: str, status: int, timings: Dict[str, float],
+                max_frames: int = 32) -> ErrorEvent:
+    resource = request.match_info.route.resource
+    return {
+        "timestamp": time(),
+        "scenario": scenario,
+        "status": status,
+        "method": request.method,
+        "route": resource.canonical if resource is not None else None,
+        "path": request.path,
+        "timings": timings,
+        "exception": snapshot(exc, max_frames),
+    }
+
+
+class EventSink:
+
+    async def write(self, events: List[ErrorEvent]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class CallbackSink(EventSink):
+
+    def __init__(self, callback: Callable[[List[ErrorEvent]], Any]):
+        self.callback = callback
+
+    async def write(self, events: List[ErrorEvent]):
+        result = self.callback(events)
+        if isawaitable(result):
+            await result
+
+
+class JsonLinesSink(EventSink):
+    # Appends one JSON document per event to a file; the file is written in an executor, a batch at a time.
+
+    def __init__(self, path: str, encoder: Callable = json.dumps, executor: Optional[Executor] = None):
+        self.path = path
+        self.encoder = encoder
+        self.executor = executor
+
+    async def write(self, events: List[ErrorEvent]):
+        lines = "".join(self.encoder(event) + "\n" for event in events)
+        await get_running_loop().run_in_executor(self.executor, self._append, lines)
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class UnixSocketSink(EventSink):
+    # Streams one JSON document per event over a Unix domain socket, reconnecting on the next batch when the
+    # connection is lost.
+
+    def __init__(self, path: str, encoder: Callable = json.dumps):
+        self.path = path
+        self.encoder = encoder
+        self._writer: Optional[StreamWriter] = None
+
+    async def write(self, events: List[ErrorEvent]):
+        if self._writer is None:
+            _, self._writer = await open_unix_connection(self.path)
+        try:
+            self._writer.write("".join(self.encoder(event) + "\n" for event in events).encode("utf-8"))
+            await self._writer.drain()
+        except Exception:
+            self._writer.close()
+            self._writer = None
+            raise
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ErrorEventExporter:  # pylint: disable=too-many-instance-attributes
+    # Error events are put on a bounded queue without waiting, and written to the sinks in batches by a background
+    # task. Once the queue is full, either the new event or the oldest queued one is dropped; ``sample_rate`` keeps
+    # only a fraction of events to begin with.
+    max_frames = 32  # The innermost frames kept of each exception's traceback.
+
+    def __init__(self, sinks: Sequence[EventSink], max_queue_size: int = 10000, batch_size: int = 100,
+                 linger: float = 0.05, overflow: str = DROP_NEWEST, sample_rate: float = 1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.sinks = list(sinks)
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self.exported = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._queue: Optional[Queue] = None
+        self._task: Optional[Task] = None
+        self._stopping = False
+
+    def emit(self, exc: BaseException, request: Request, scenario: str, status: int, timings: Dict[str, float]):
+        if self.sample_rate < 1.0 and random() >= self.sample_rate:  # nosec - sampling isn't security sensitive
+            self.sampled_out += 1
+            return
+        if self._stopping:
+            self.dropped += 1
+            return
+        if self._task is None:
+            self.start()
+        self.put(error_event(exc, request, scenario, status, timings, self.max_frames))
+
+    def put(self, event: ErrorEvent):
+        queue = self._queue
+        try:
+            queue.put_nowait(event)
+            return
+        except QueueFull:
+            self.dropped += 1
+            if self.overflow == DROP_NEWEST:
+                return
+        queue.get_nowait()
+        queue.put_nowait(event)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._queue = Queue(maxsize=self.max_queue_size)
+        self._task = get_running_loop().create_task(self._drain())
+
+    async def stop(self):
+        # Writes out every queued event before closing the sinks.
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+        for sink in self.sinks:
+            await sink.close()
+
+    async def on_startup(self, app: Application):  # pylint: disable=unused-argument
+        self.start()
+
+    async def on_cleanup(self, app: Application):  # pylint: disable=unused-argument
+        await self.stop()
+
+    async def _drain(self):
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            if event is _STOP:
+                return
+            if self.linger:
+                await sleep(self.linger)
+            batch = [event]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    event = queue.get_nowait()
+                except QueueEmpty:
+                    break
+                if event is _STOP:
+                    stop = True
+                    break
+                batch.append(event)
+            await self._write(batch)
+            if stop:
+                return
+
+    async def _write(self, batch: List[ErrorEvent]):
+        for sink in self.sinks:
+            try:
+                await sink.write(batch)
+            except Exception:
+                LOGGER.exception("aiohttp-catcher could not export %d error events to %s", len(batch),
+                                 type(sink).__name__)
+        self.exported += len(batch)
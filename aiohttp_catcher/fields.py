@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, Tuple
+
+from aiohttp.web import Request
+
+from aiohttp_catcher.predicates import get_attribute, MISSING
+
+
+class Field:  # pylint: disable=too-few-public-methods
+    # A value of an additional fields template, taken from the request or the exception once it's caught.
+    __slots__ = ()
+
+    def extract(self, exc: BaseException, request: Request) -> Any:
+        raise NotImplementedError
+
+
+class _Header(Field):  # pylint: disable=too-few-public-methods
+    __slots__ = ("name", "default")
+
+    def __init__(self, name: str, default: Any = None):
+        self.name = name
+        self.default = default
+
+    def extract(self, exc: BaseException, request: Request) -> Any:  # pylint: disable=unused-argument
+        return request.headers.get(self.name, self.default)
+
+
+class _Query(_Header):  # pylint: disable=too-few-public-methods
+    __slots__ = ()
+
+    def extract(self, exc: BaseException, request: Request) -> Any:  # pylint: disable=unused-argument
+        return request.query.get(self.name, self.default)
+
+
+class _MatchInfo(_Header):  # pylint: disable=too-few-public-methods
+    __slots__ = ()
+
+    def extract(self, exc: BaseException, request: Request) -> Any:  # pylint: disable=unused-argument
+        return request.match_info.get(self.name, self.default)
+
+
+class _ExceptionAttribute(_Header):  # pylint: disable=too-few-public-methods
+    __slots__ = ()
+
+    def extract(self, exc: BaseException, request: Request) -> Any:  # pylint: disable=unused-argument
+        value = get_attribute(exc, self.name)
+        return self.default if value is MISSING else value
+
+
+class _RequestAttribute(Field):  # pylint: disable=too-few-public-methods
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def extract(self, exc: BaseException, request: Request) -> Any:  # pylint: disable=unused-argument
+        return getattr(request, self.name)
+
+
+def header(name: str, default: Any = None) -> Field:
+    return _Header(name, default)
+
+
+def query(name: str, default: Any = None) -> Field:
+    return _Query(name, default)
+
+
+def match_info(name: str, default: Any = None) -> Field:
+    return _MatchInfo(name, default)
+
+
+def exc_attr(name: str, default: Any = None) -> Field:
+    return _ExceptionAttribute(name, default)
+
+
+def req_path() -> Field:
+    return _RequestAttribute("path")
+
+
+def req_method() -> Field:
+    return _RequestAttribute("method")
+
+
+def is_template(additional_fields: Any) -> bool:
+    return isinstance(additional_fields, Dict) and any(isinstance(v, Field) for v in additional_fields.values())
+
+
+class Template:  # pylint: disable=too-few-public-methods
+    # An additional fields dictionary with some of its values taken from the request or the exception, split into
+    # its static and dynamic parts once, when it's compiled.
+    __slots__ = ("fields", "static", "dynamic")
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+        self.static = {name: value for name, value in fields.items() if not isinstance(value, Field)}
+        self.dynamic: Tuple[Tuple[str, Callable], ...] = tuple(
+            (name, value.extract) for name, value in fields.items() if isinstance(value, Field)
+        )
+
+    def __call__(self, exc: BaseException, request: Request) -> Dict[str, Any]:
+        additional_fields = dict(self.static)
+        for name, extract in self.dynamic:
+            additional_fields[name] = extract(exc, request)
+        return additional_fields
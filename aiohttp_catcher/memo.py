@@ -0,0 +1,96 @@
+from asyncio import CancelledError, Future, get_running_loop, shield
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from aiohttp.web import Request
+
+KeyFunction = Callable[[Exception, Request], Hashable]
+
+
+class _LeaderCancelled(Exception):
+    # Fails the calls waiting on a cancelled call, so that one of them makes the call in its stead.
+    pass
+
+
+class Memo:
+    # An LRU cache, with an optional TTL, of a scenario callable's results, keyed by a function of the exception
+    # and the request. Concurrent misses of an async callable for the same key are coalesced into a single call.
+
+    def __init__(self, func: Callable, is_coroutine: bool, key: KeyFunction, max_size: int = 1024,
+                 ttl: Optional[float] = None):
+        self.func = func
+        self.is_coroutine = is_coroutine
+        self.key = key
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def _get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires is not None and expires <= monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _set(self, key: Hashable, value: Any):
+        self._entries[key] = (None if self.ttl is None else monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __call__(self, exc: Exception, request: Request) -> Any:
+        if self.is_coroutine:
+            return self._call_async(exc, request)
+        key = self.key(exc, request)
+        hit, value = self._get(key)
+        if not hit:
+            value = self.func(exc, request)
+            self._set(key, value)
+        return value
+
+    async def _call_async(self, exc: Exception, request: Request) -> Any:
+        key = self.key(exc, request)
+        hit, value = self._get(key)
+        if hit:
+            return value
+        while True:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            try:
+                # Shielded, so that cancelling one waiter doesn't cancel the call for the others:
+                return await shield(in_flight)
+            except _LeaderCancelled:
+                pass
+        future = self._in_flight[key] = get_running_loop().create_future()
+        try:
+            value = await self.func(exc, request)
+        except CancelledError:
+            self._fail(future, _LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        if not future.done():
+            future.set_result(value)
+        self._set(key, value)
+        return value
+
+    @staticmethod
+    def _fail(future: Future, exc: BaseException):
+        if not future.done():
+            future.set_exception(exc)
+            # Nobody may be awaiting the future; don't have asyncio complain about it:
+            future.exception()
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,86 @@
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from aiohttp.web import Request, Response
+
+PHASES = ("resolution", "message", "additional_fields", "encoding")
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0)
+
+
+class MetricsSink:  # pylint: disable=too-few-public-methods
+
+    def observe(self, scenario: str, status: int, timings: Dict[str, float]):
+        raise NotImplementedError
+
+
+class Histogram:
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        cumulative = []
+        for bound, count in zip((*(repr(b) for b in self.buckets), "+Inf"), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics(MetricsSink):
+    # In-memory counters of caught errors by scenario and status code, along with latency histograms of each
+    # phase of the error path; exposed in the Prometheus text format.
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, namespace: str = "aiohttp_catcher"):
+        self.namespace = namespace
+        self.errors: Dict[Tuple[str, int], int] = {}
+        self.latencies: Dict[str, Histogram] = {phase: Histogram(buckets) for phase in (*PHASES, "total")}
+
+    def observe(self, scenario: str, status: int, timings: Dict[str, float]):
+        key = (scenario, status)
+        self.errors[key] = self.errors.get(key, 0) + 1
+        latencies = self.latencies
+        total = 0.0
+        for phase, duration in timings.items():
+            histogram = latencies.get(phase)
+            if histogram is not None:
+                histogram.observe(duration)
+            total += duration
+        latencies["total"].observe(total)
+
+    def render_prometheus(self) -> str:
+        errors_metric = f"{self.namespace}_errors_total"
+        latency_metric = f"{self.namespace}_error_path_seconds"
+        lines = [
+            f"# HELP {errors_metric} Exceptions caught, by scenario and status code.",
+            f"# TYPE {errors_metric} counter",
+        ]
+        for (scenario, status), count in sorted(self.errors.items()):
+            lines.append(f'{errors_metric}{{scenario="{_escape(scenario)}",status="{status}"}} {count}')
+        lines.extend([
+            f"# HELP {latency_metric} Time spent in the error path, by phase.",
+            f"# TYPE {latency_metric} histogram",
+        ])
+        for phase, histogram in self.latencies.items():
+            for bound, count in histogram.cumulative():
+                lines.append(f'{latency_metric}_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'{latency_metric}_sum{{phase="{phase}"}} {histogram.sum!r}')
+            lines.append(f'{latency_metric}_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    async def handler(self, request: Request) -> Response:  # pylint: disable=unused-argument
+        return Response(body=self.render_prometheus().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
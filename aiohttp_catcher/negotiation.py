@@ -0,0 +1,49 @@
+from typing import List, Optional, Sequence, Tuple
+
+
+def parse_accept(accept: str) -> List[Tuple[str, float]]:
+    media_ranges = []
+    for item in accept.split(","):
+        media_range, *params = item.split(";")
+        media_range = media_range.strip().lower()
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_ranges.append((media_range, quality))
+    return media_ranges
+
+
+def _quality(media_type: str, media_ranges: List[Tuple[str, float]]) -> float:
+    # The quality of a media type is that of the most specific media range matching it.
+    wildcard = f"{media_type.split('/', 1)[0]}/*"
+    specificity, quality = -1, 0.0
+    for media_range, range_quality in media_ranges:
+        if media_range == media_type:
+            range_specificity = 2
+        elif media_range == wildcard:
+            range_specificity = 1
+        elif media_range == "*/*":
+            range_specificity = 0
+        else:
+            continue
+        if range_specificity > specificity:
+            specificity, quality = range_specificity, range_quality
+    return quality
+
+
+def negotiate(accept: str, media_types: Sequence[str]) -> Optional[str]:
+    # Picks the acceptable media type with the highest quality; ties are broken by the order of ``media_types``.
+    media_ranges = parse_accept(accept)
+    best, best_quality = None, 0.0
+    for media_type in media_types:
+        quality = _quality(media_type, media_ranges)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
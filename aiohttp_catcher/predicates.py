@@ -0,0 +1,150 @@
+from typing import Any, Dict, Hashable, List, Optional, Pattern, Tuple
+
+MISSING = object()
+
+
+def get_attribute(exc: BaseException, name: str) -> Any:
+    # ``message`` stands for the stringified exception; any other name for an attribute of the exception.
+    if name == "message":
+        return str(exc)
+    return getattr(exc, name, MISSING)
+
+
+def is_predicate(condition: Any) -> bool:
+    return callable(condition) and not isinstance(condition, type)
+
+
+def matches(condition: Any, value: Any) -> bool:
+    # A condition is either a compiled regular expression, searched for in the stringified value, a predicate
+    # called with the value, or a value the attribute must equal.
+    if value is MISSING:
+        return False
+    if isinstance(condition, Pattern):
+        return condition.search(str(value)) is not None
+    if is_predicate(condition):
+        return bool(condition(value))
+    return value == condition
+
+
+def index_key(conditions: Dict[str, Any]) -> Optional[Tuple[str, Hashable]]:
+    # The first equality condition with a hashable value, by which a scenario can be looked up in O(1).
+    for name, condition in conditions.items():
+        if isinstance(condition, Pattern) or is_predicate(condition):
+            continue
+        try:
+            hash(condition)
+        except TypeError:
+            continue
+        return name, condition
+    return None
+
+
+def _replace(scenarios: Tuple[Any, ...], scenario: Any) -> Tuple[Any, ...]:
+    for position, existing in enumerate(scenarios):
+        if existing.conditions == scenario.conditions:
+            return (*scenarios[:position], scenario, *scenarios[position + 1:])
+    return (*scenarios, scenario)
+
+
+class ScenarioIndex:
+    # The scenarios registered for an exception type with attribute conditions, indexed by the value of one of
+    # their equality conditions; scenarios without any are checked one by one, and the scenario registered without
+    # conditions, if any, is the fallback. Indexes are never mutated - registering returns a new one.
+    __slots__ = ("indexed", "scanned", "fallback")
+    is_index = True
+
+    def __init__(self, indexed: Optional[Dict[str, Dict[Hashable, Tuple[Any, ...]]]] = None,
+                 scanned: Tuple[Any, ...] = (), fallback: Any = None):
+        self.indexed = indexed or {}
+        self.scanned = scanned
+        self.fallback = fallback
+
+    def with_scenario(self, scenario: Any) -> "ScenarioIndex":
+        # A scenario registered with the same conditions as an earlier one replaces it, in its place.
+        key = index_key(scenario.conditions)
+        if key is None:
+            return ScenarioIndex(self.indexed, _replace(self.scanned, scenario), self.fallback)
+        name, value = key
+        indexed = {attribute: dict(table) for attribute, table in self.indexed.items()}
+        table = indexed.setdefault(name, {})
+        table[value] = _replace(table.get(value, ()), scenario)
+        return ScenarioIndex(indexed, self.scanned, self.fallback)
+
+    def has_conditions(self, conditions: Dict[str, Any]) -> bool:
+        return any(scenario.conditions == conditions for scenario in self.scenarios())
+
+    def with_fallback(self, scenario: Any) -> "ScenarioIndex":
+        return ScenarioIndex(self.indexed, self.scanned, scenario)
+
+    def specialize(self, exc_type: type) -> "ScenarioIndex":
+        return ScenarioIndex(
+            {name: {value: tuple(s.specialize(exc_type) for s in scenarios) for value, scenarios in table.items()}
+             for name, table in self.indexed.items()},
+            tuple(s.specialize(exc_type) for s in self.scanned),
+            self.fallback.specialize(exc_type) if self.fallback is not None else None
+        )
+
+    def scenarios(self) -> List[Any]:
+        scenarios = [s for table in self.indexed.values() for candidates in table.values() for s in candidates]
+        scenarios.extend(self.scanned)
+        if self.fallback is not None:
+            scenarios.append(self.fallback)
+        return scenarios
+
+    def select(self, exc: BaseException) -> Any:
+        for name, table in self.indexed.items():
+            try:
+                candidates = table.get(get_attribute(exc, name))
+            except TypeError:
+                continue
+            if candidates:
+                for scenario in candidates:
+                    if scenario.matches(exc):
+                        return scenario
+        for scenario in self.scanned:
+            if scenario.matches(exc):
+                return scenario
+        return self.fallback
+
+
+class ScenarioChain:
+    # The scenarios an exception type may resolve to, from its nearest registered ancestor onwards, for when some
+    # of them are conditional; selecting one of them depends on the exception itself.
+    __slots__ = ("entries",)
+    is_index = True
+
+    def __init__(self, entries: Tuple[Any, ...]):
+        self.entries = entries
+
+    @property
+    def priority(self) -> int:
+        return max(scenario.priority for entry in self.entries for scenario in expand(entry))
+
+    def select(self, exc: BaseException) -> Any:
+        for entry in self.entries:
+            if entry.is_index:
+                scenario = entry.select(exc)
+                if scenario is not None:
+                    return scenario
+            else:
+                return entry
+        return None
+
+
+def register(scenario_map: Dict[str, Any], name: str, scenario: Any) -> bool:
+    # Registers the scenario for the exception type name; returns whether an existing scenario was overridden.
+    existing = scenario_map.get(name)
+    if scenario.conditions:
+        if existing is None or not existing.is_index:
+            existing = ScenarioIndex(fallback=existing)
+        scenario_map[name] = existing.with_scenario(scenario)
+        return existing.has_conditions(scenario.conditions)
+    if existing is not None and existing.is_index:
+        scenario_map[name] = existing.with_fallback(scenario)
+        return existing.fallback is not None
+    scenario_map[name] = scenario
+    return existing is not None
+
+
+def expand(entry: Any) -> List[Any]:
+    return entry.scenarios() if entry.is_index else [entry]
@@ -0,0 +1,81 @@
+from importlib import import_module
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
+import json
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from aiohttp_catcher.predicates import register
+from aiohttp_catcher.scenario import BaseScenario, FrozenScenario, Scenario
+
+
+def _full_class_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__name__}"
+
+
+def _import_class(name: str) -> type:
+    # Exceptions named in scenario files, such as "builtins.ZeroDivisionError" or "myapp.errors.EntityNotFound".
+    module, _, qualname = name.rpartition(".")
+    cls = import_module(module or "builtins")
+    for attr in qualname.split("."):
+        cls = getattr(cls, attr)
+    return cls
+
+
+def _read_scenarios(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise RuntimeError("Loading scenarios from TOML files requires Python 3.11 or the tomli package")
+        with open(path, "rb") as f:
+            return tomllib.load(f)["scenarios"]
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["scenarios"] if isinstance(data, Dict) else data
+
+
+class ScenarioRegistry:
+    # A compact, immutable and picklable set of scenarios, built synchronously and in bulk. Build it once in the
+    # parent process and hand it to the catchers of forked workers, which share it rather than rebuilding it.
+    __slots__ = ("scenario_map",)
+
+    def __init__(self, scenario_map: Mapping[str, BaseScenario]):
+        self.scenario_map: Mapping[str, BaseScenario] = MappingProxyType(dict(scenario_map))
+
+    def __reduce__(self) -> Tuple[type, Tuple[Dict[str, BaseScenario]]]:
+        # Mapping proxies can't be pickled; the registry is rebuilt from a copy of its scenarios.
+        return type(self), (dict(self.scenario_map),)
+
+    @classmethod
+    def build(cls, scenarios: Iterable[Union[BaseScenario, Dict]]) -> "ScenarioRegistry":
+        # Plain scenarios are converted to frozen ones; instances of Scenario subclasses are kept as they are, so
+        # as not to lose their behaviour. Later scenarios override earlier ones, as with Catcher.add_scenarios().
+        scenario_map = {}
+        for scenario in scenarios:
+            if isinstance(scenario, Dict):
+                scenario = Scenario(**scenario)
+            if type(scenario) is Scenario:  # pylint: disable=unidiomatic-typecheck
+                scenario = FrozenScenario(scenario)
+            for exc in scenario.exceptions:
+                register(scenario_map, _full_class_name(exc), scenario)
+        return cls(scenario_map)
+
+    @classmethod
+    def load(cls, path: str) -> "ScenarioRegistry":
+        # Builds a registry from a JSON or TOML file of scenario dictionaries, with their exceptions named by their
+        # full class names. JSON files hold either a list of scenarios or a "scenarios" list; TOML files hold a
+        # "scenarios" array of tables.
+        scenarios = []
+        for scenario in _read_scenarios(path):
+            scenario = dict(scenario)
+            scenario["exceptions"] = [_import_class(name) for name in scenario["exceptions"]]
+            scenarios.append(scenario)
+        return cls.build(scenarios)
+
+    def __len__(self) -> int:
+        return len(self.scenario_map)
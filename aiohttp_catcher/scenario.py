@@ -1,23 +1,147 @@
-from typing import Any, Awaitable, Callable, Dict, List, Type, Union
+from asyncio import get_running_loop, Semaphore
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, Union
 from inspect import isawaitable, iscoroutine, iscoroutinefunction
 
 from aiohttp.web import Request
 
+from aiohttp_catcher.fields import is_template, Template
+from aiohttp_catcher.memo import KeyFunction, Memo
+from aiohttp_catcher.predicates import get_attribute, matches
+
 
 def is_async(f):
     return isawaitable(f) or iscoroutine(f) or iscoroutinefunction(f)
 
 
-class Scenario:
+def _stringify(exc: Exception, request: Request) -> str:  # pylint: disable=unused-argument
+    return str(exc)
+
+
+def _no_additional_fields(exc: Exception, request: Request) -> Dict:  # pylint: disable=unused-argument
+    return {}
+
+
+class BaseScenario:
+    __slots__ = ()
+    is_index = False
+    # Declared here, and defined by subclasses:
+    exceptions: List[Type[Exception]]
+    func: Union[Callable, Awaitable]
+    constant: Any
+    stringify_exception: bool
+    status_code: int
+    additional_fields: Union[Dict, Callable, Awaitable]
+    is_callable: bool
+    reraise: bool
+    offload: bool
+    executor: Optional[Executor]
+    max_pending: int
+    conditions: Dict[str, Any]
+    priority: int
+    cache_key: Optional[KeyFunction]
+    cache_size: int
+    cache_ttl: Optional[float]
+    _pending: Optional[Semaphore]
+    _memos: Dict[Callable, Memo]
+
+    def matches(self, exc: BaseException) -> bool:
+        return all(matches(condition, get_attribute(exc, name)) for name, condition in self.conditions.items())
+
+    @property
+    def is_static(self) -> bool:
+        return not self.is_callable and not self.stringify_exception and \
+            (not self.additional_fields or isinstance(self.additional_fields, Dict)) and \
+            not is_template(self.additional_fields)
+
+    def specialize(self, exc_type: type) -> "BaseScenario":  # pylint: disable=unused-argument
+        # The scenario handling exceptions of the given type; resolved once per type.
+        return self
+
+    async def get_response_message(self, exc: Exception, request: Request) -> Any:
+        get_message, message_is_async = self.compile_response_message()
+        message = get_message(exc, request)
+        if message_is_async:
+            message = await message
+        return message
+
+    async def get_additional_fields(self, exc: Exception, req: Request) -> Dict:
+        get_fields, fields_are_async = self.compile_additional_fields()
+        additional_fields = get_fields(exc, req)
+        if fields_are_async:
+            additional_fields = await additional_fields
+        return additional_fields
+
+    def _compile_callable(self, func: Callable) -> Tuple[Callable, bool]:
+        compiled, is_coroutine = self._compile_offloaded(func)
+        if self.cache_key is None:
+            return compiled, is_coroutine
+        # Memos are kept by the scenario, so that every catcher compiling it shares them:
+        memo = self._memos.get(func)
+        if memo is None:
+            memo = self._memos[func] = Memo(compiled, is_coroutine, self.cache_key, self.cache_size, self.cache_ttl)
+        return memo, is_coroutine
+
+    def _compile_offloaded(self, func: Callable) -> Tuple[Callable, bool]:
+        if is_async(func):
+            return func, True
+        if not self.offload:
+            return func, False
+
+        # Synchronous callables are run in the scenario's executor, with at most ``max_pending`` of them submitted
+        # at once; further calls wait for a slot. Requests can't be sent to other processes, so callables run in
+        # a process pool are passed None instead.
+        pass_request = not isinstance(self.executor, ProcessPoolExecutor)
+
+        async def offloaded(exc: Exception, request: Request) -> Any:
+            if self._pending is None:
+                object.__setattr__(self, "_pending", Semaphore(self.max_pending))
+            async with self._pending:
+                return await get_running_loop().run_in_executor(self.executor, func, exc,
+                                                                request if pass_request else None)
+        return offloaded, True
+
+    def compile_response_message(self) -> Tuple[Callable, bool]:
+        if self.is_callable:
+            return self._compile_callable(self.func)
+        if self.stringify_exception:
+            return _stringify, False
+        constant = self.constant
+        return lambda exc, request: constant, False
+
+    def compile_additional_fields(self) -> Tuple[Callable, bool]:
+        if not self.additional_fields:
+            return _no_additional_fields, False
+        if is_template(self.additional_fields):
+            return Template(self.additional_fields), False
+        if isinstance(self.additional_fields, Dict):
+            additional_fields = self.additional_fields
+            return lambda exc, request: additional_fields, False
+        return self._compile_callable(self.additional_fields)
+
+
+class Scenario(BaseScenario):  # pylint: disable=too-many-instance-attributes
     status_code: int = 500
     is_callable: bool = False
     stringify_exception: bool = False
     additional_fields: Union[Dict, Callable, Awaitable] = None
+    reraise: bool = False
+    priority: int = 0
+    offload: bool = False
+    executor: Optional[Executor] = None
+    max_pending: int = 64
+    cache_key: Optional[KeyFunction] = None
+    cache_size: int = 1024
+    cache_ttl: Optional[float] = None
 
     def __init__(self, exceptions: List[Type[Exception]], func: Union[Callable, Awaitable] = None,
                  constant: Any = "Internal server error", stringify_exception: bool = False, status_code: int = 500,
                  additional_fields: Union[Dict, Callable, Awaitable] = None):
+        # Conditions, priorities, caching, executors and re-raising are set with the builder methods below.
         self.exceptions = exceptions
+        self.conditions: Dict[str, Any] = {}
+        self._memos: Dict[Callable, Memo] = {}
+        self._pending: Optional[Semaphore] = None
         self.stringify_exception = stringify_exception
         self.func = func
         self.constant = constant
@@ -27,28 +151,14 @@ class Scenario:
                 self.is_callable = True
         self.status_code = status_code
 
-    async def get_response_message(self, exc: Exception, request: Request) -> Any:
-        if self.is_callable:
-            if is_async(self.func):
-                return await self.func(exc, request)
-            return self.func(exc, request)
-        if self.stringify_exception:
-            return str(exc)
-        return self.constant
-
-    async def get_additional_fields(self, exc: Exception, req: Request) -> Dict:
-        if not self.additional_fields:
-            return {}
-        if isinstance(self.additional_fields, Dict):
-            return self.additional_fields
-        if is_async(self.additional_fields):
-            return await self.additional_fields(exc, req)
-        return self.additional_fields(exc, req)
-
     def with_status_code(self, status_code) -> "Scenario":
         self.status_code = status_code
         return self
 
+    def with_priority(self, priority: int) -> "Scenario":
+        self.priority = priority
+        return self
+
     def with_additional_fields(self, additional_fields: Union[Dict, Callable, Awaitable]) -> "Scenario":
         self.additional_fields = additional_fields
         return self
@@ -66,6 +176,57 @@ class Scenario:
         self.func = func
         return self
 
+    def where(self, **conditions: Any) -> "Scenario":
+        self.conditions.update(conditions)
+        return self
+
+    def with_cache(self, key: KeyFunction, max_size: int = 1024, ttl: Optional[float] = None) -> "Scenario":
+        # Memoizes the scenario's callables by ``key(exc, request)``.
+        self.cache_key = key
+        self.cache_size = max_size
+        self.cache_ttl = ttl
+        return self
+
+    def and_reraise(self) -> "Scenario":
+        self.reraise = True
+        return self
+
+    def in_executor(self, executor: Optional[Executor] = None, max_pending: int = 64) -> "Scenario":
+        self.offload = True
+        self.executor = executor
+        self.max_pending = max_pending
+        return self
+
+
+class FrozenScenario(BaseScenario):
+    # An immutable, picklable copy of a scenario without a per-instance dict, for large registries built once and
+    # shared by forked worker processes.
+    __slots__ = ("exceptions", "func", "constant", "stringify_exception", "status_code", "additional_fields",
+                 "is_callable", "reraise", "offload", "executor", "max_pending", "conditions", "priority",
+                 "cache_key", "cache_size", "cache_ttl", "_pending", "_memos")
+
+    def __init__(self, scenario: Scenario):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(scenario, name))
+        object.__setattr__(self, "exceptions", tuple(scenario.exceptions))
+        if isinstance(scenario.additional_fields, Dict):
+            object.__setattr__(self, "additional_fields", dict(scenario.additional_fields))
+        object.__setattr__(self, "conditions", dict(scenario.conditions))
+        object.__setattr__(self, "_pending", None)
+        object.__setattr__(self, "_memos", {})
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getstate__(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+    def __setstate__(self, state: Dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_pending", None)
+        object.__setattr__(self, "_memos", {})
+
 
-def catch(*exceptions: Type[Exception]) -> Scenario:
-    return Scenario(exceptions=list(exceptions))
+def catch(*exceptions: Type[Exception], **conditions: Any) -> Scenario:
+    return Scenario(exceptions=list(exceptions)).where(**conditions)
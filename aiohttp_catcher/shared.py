@@ -0,0 +1,139 @@
+from mmap import mmap
+from multiprocessing import Lock
+from os import getpid, kill
+from struct import Struct
+from typing import Dict, Iterator, Optional, Tuple
+import logging
+
+from aiohttp.web import json_response, Request, Response
+
+LOGGER = logging.getLogger(__name__)
+
+OVERFLOW = ("overflow", 0)
+
+_HEADER = Struct("QQ")  # The worker's pid, and the number of keys it registered.
+_COUNTER = Struct("Q")
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedErrorStats:  # pylint: disable=too-many-instance-attributes
+    # Error counts by scenario and status code, shared by every worker forked after it's created. The anonymous
+    # memory map is split into one shard per worker: a worker claims a shard the first time it counts an error, and
+    # is the only process ever writing to it, so counting takes no lock. Each shard holds up to ``slots`` keys,
+    # the last of which counts the errors of any further keys; snapshots add up the shards. Attach its ``count``
+    # to catchers as an error counter.
+
+    def __init__(self, slots: int = 256, workers: int = 64, key_size: int = 120):
+        self.slots = slots
+        self.workers = workers
+        self.key_size = -(-key_size // 8) * 8
+        self._keys_offset = _HEADER.size
+        self._counters_offset = self._keys_offset + slots * self.key_size
+        self.shard_size = self._counters_offset + slots * 8
+        self._memory = mmap(-1, self.shard_size * workers)
+        self._lock = Lock()
+        self._pid: Optional[int] = None
+        self._shard: Optional[int] = None
+        self._index: Dict[Tuple[str, int], int] = {}
+        self._counters: Optional[memoryview] = None
+
+    def count(self, scenario: str, status: int):
+        if self._pid != getpid():
+            self._claim()
+        if self._counters is None:
+            return
+        slot = self._index.get((scenario, status))
+        if slot is None:
+            slot = self._register((scenario, status))
+        self._counters[slot] += 1
+
+    def _claim(self):
+        # Claims a shard that's free, or that belonged to a worker that's no longer running - in which case its
+        # counts are carried on.
+        self._pid = getpid()
+        self._shard = self._counters = None
+        self._index = {}
+        with self._lock:
+            for shard in range(self.workers):
+                pid, _ = _HEADER.unpack_from(self._memory, shard * self.shard_size)
+                if pid == 0 or not _is_alive(pid):
+                    _HEADER.pack_into(self._memory, shard * self.shard_size, self._pid,
+                                      self._key_count(shard))
+                    self._shard = shard
+                    break
+        if self._shard is None:
+            LOGGER.warning("aiohttp-catcher has no shared statistics shard left for worker %d; its errors won't be "
+                           "counted", self._pid)
+            return
+        offset = self._shard * self.shard_size
+        for slot, key in self._keys(self._shard):
+            self._index[key] = slot
+        self._counters = memoryview(self._memory)[offset + self._counters_offset:offset + self.shard_size].cast("Q")
+
+    def _register(self, key: Tuple[str, int]) -> int:
+        offset = self._shard * self.shard_size
+        count = self._key_count(self._shard)
+        if count >= self.slots - 1:
+            if OVERFLOW not in self._index:
+                self._write_key(offset, self.slots - 1, OVERFLOW)
+                self._index[OVERFLOW] = self.slots - 1
+            self._index[key] = self.slots - 1
+            return self.slots - 1
+        self._write_key(offset, count, key)
+        # The key is written before it's counted in, so that snapshots never read a partially written key:
+        _HEADER.pack_into(self._memory, offset, self._pid, count + 1)
+        self._index[key] = count
+        return count
+
+    def _write_key(self, offset: int, slot: int, key: Tuple[str, int]):
+        scenario, status = key
+        encoded = f"{status}\0{scenario}".encode("utf-8")[:self.key_size].ljust(self.key_size, b"\0")
+        start = offset + self._keys_offset + slot * self.key_size
+        self._memory[start:start + self.key_size] = encoded
+
+    def _key_count(self, shard: int) -> int:
+        return _HEADER.unpack_from(self._memory, shard * self.shard_size)[1]
+
+    def _keys(self, shard: int) -> Iterator[Tuple[int, Tuple[str, int]]]:
+        offset = shard * self.shard_size + self._keys_offset
+        count = self._key_count(shard)
+        slots = list(range(count))
+        if count >= self.slots - 1:
+            slots.append(self.slots - 1)
+        for slot in slots:
+            raw = self._memory[offset + slot * self.key_size:offset + (slot + 1) * self.key_size].rstrip(b"\0")
+            status, _, scenario = raw.decode("utf-8", errors="ignore").partition("\0")
+            if not scenario:
+                continue
+            yield slot, (scenario, int(status))
+
+    def snapshot(self) -> Dict[Tuple[str, int], int]:
+        # The error counts of every worker, read without locking; counts still being incremented may be off by one.
+        errors: Dict[Tuple[str, int], int] = {}
+        for shard in range(self.workers):
+            offset = shard * self.shard_size + self._counters_offset
+            for slot, key in self._keys(shard):
+                count = _COUNTER.unpack_from(self._memory, offset + slot * 8)[0]
+                errors[key] = errors.get(key, 0) + count
+        return errors
+
+    @property
+    def live_workers(self) -> int:
+        pids = (_HEADER.unpack_from(self._memory, shard * self.shard_size)[0] for shard in range(self.workers))
+        return sum(1 for pid in pids if pid and _is_alive(pid))
+
+    async def handler(self, request: Request) -> Response:  # pylint: disable=unused-argument
+        return json_response({
+            "workers": self.live_workers,
+            "errors": [{"scenario": scenario, "status": status, "count": count}
+                       for (scenario, status), count in sorted(self.snapshot().items())],
+        })
@@ -0,0 +1,27 @@
+from typing import Callable, Dict
+
+# The request key the catcher keeps the request's prepared response under.
+PREPARED_RESPONSE = "aiohttp_catcher_prepared_response"
+
+Framing = Callable[[bytes], bytes]
+
+
+def ndjson(record: bytes) -> bytes:
+    return record + b"\n"
+
+
+def json_seq(record: bytes) -> bytes:
+    return b"\x1e" + record + b"\n"
+
+
+def sse(record: bytes) -> bytes:
+    data = b"".join(b"data: " + line + b"\n" for line in record.split(b"\n"))
+    return b"event: error\n" + data + b"\n"
+
+
+DEFAULT_FRAMINGS: Dict[str, Framing] = {
+    "application/x-ndjson": ndjson,
+    "application/jsonl": ndjson,
+    "application/json-seq": json_seq,
+    "text/event-stream": sse,
+}
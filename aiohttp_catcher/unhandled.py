@@ -0,0 +1,109 @@
+from asyncio import get_running_loop, TimerHandle
+from concurrent.futures import Executor
+from time import monotonic
+from typing import Dict, Optional, Tuple, Type, Union
+import logging
+
+from aiohttp.web import Application
+
+# Unhandled exceptions are logged on the catcher's logger, as they were before they were rate-limited:
+LOGGER = logging.getLogger("aiohttp_catcher.catcher")
+
+Fingerprint = Tuple[type, str, int]
+LimitKey = Union[Type[BaseException], Fingerprint]
+
+
+def fingerprint(exc: BaseException) -> Fingerprint:
+    # An exception's type and the frame it was raised from; walking the traceback is cheap, formatting it isn't.
+    trace = exc.__traceback__
+    if trace is None:
+        return type(exc), "", 0
+    while trace.tb_next is not None:
+        trace = trace.tb_next
+    return type(exc), trace.tb_frame.f_code.co_filename, trace.tb_lineno
+
+
+class UnhandledExceptionLogger:  # pylint: disable=too-many-instance-attributes
+    # Limits are keyed by fingerprint, or by exception type for all of the type's fingerprints. Suppressed
+    # exceptions are summarized once the interval they were suppressed in is over - by a timer, when there's a
+    # running event loop, so that summaries aren't held back until the next exception is logged.
+
+    def __init__(self, per_fingerprint_limit: int = 10, global_limit: int = 100, interval: float = 60.0,
+                 limits: Optional[Dict[LimitKey, int]] = None, offload: bool = False,
+                 executor: Optional[Executor] = None):
+        self.per_fingerprint_limit = per_fingerprint_limit
+        self.global_limit = global_limit
+        self.interval = interval
+        self.limits = limits or {}
+        self.offload = offload
+        self.executor = executor
+        self._window_start = monotonic()
+        self._counts: Dict[Fingerprint, int] = {}
+        self._suppressed: Dict[Fingerprint, int] = {}
+        self._logged = 0
+        self._timer: Optional[TimerHandle] = None
+
+    def log(self, exc: BaseException) -> bool:
+        # Logs the exception with its traceback, unless its fingerprint (or the catcher as a whole) has exceeded
+        # its limit in the current interval; suppressed exceptions are counted and summarized by ``flush()``.
+        now = monotonic()
+        if now - self._window_start >= self.interval:
+            self.flush()
+            self._window_start = now
+        key = fingerprint(exc)
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        limit = self.limits.get(key)
+        if limit is None:
+            limit = self.limits.get(key[0], self.per_fingerprint_limit)
+        if count > limit or self._logged >= self.global_limit:
+            if not self._suppressed and self._timer is None:
+                self._schedule(self._window_start + self.interval - now)
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        self._logged += 1
+        if self.offload:
+            try:
+                get_running_loop().run_in_executor(self.executor, self._log_exception, exc)
+                return True
+            except RuntimeError:
+                pass
+        self._log_exception(exc)
+        return True
+
+    def flush(self):
+        for (exc_type, filename, lineno), suppressed in self._suppressed.items():
+            LOGGER.warning("aiohttp-catcher suppressed %d occurrences of unhandled %s.%s raised at %s:%d", suppressed,
+                           exc_type.__module__, exc_type.__name__, filename, lineno)
+        self._counts = {}
+        self._suppressed = {}
+        self._logged = 0
+
+    def _schedule(self, delay: float):
+        try:
+            self._timer = get_running_loop().call_later(delay, self._on_timer)
+        except RuntimeError:
+            pass
+
+    def _on_timer(self):
+        self._timer = None
+        now = monotonic()
+        if now - self._window_start >= self.interval:
+            self.flush()
+            self._window_start = now
+        elif self._suppressed:
+            self._schedule(self._window_start + self.interval - now)
+
+    def stop(self):
+        # Cancels the pending summary, and logs it right away.
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.flush()
+
+    async def on_cleanup(self, app: Application):  # pylint: disable=unused-argument
+        self.stop()
+
+    @staticmethod
+    def _log_exception(exc: BaseException):
+        LOGGER.error("aiohttp-catcher caught an unhandled exception", exc_info=exc)
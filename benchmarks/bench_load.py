@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of an aiohttp application with and without ``Catcher.middleware``.
+
+Each mode serves a local application - with the catcher and the canned ``AIOHTTP_SCENARIOS``, or without any
+middleware - in a forked process, and drives it over TCP from an in-process client at a fixed concurrency, with
+the given share of failing requests.  Reports throughput, latency percentiles and RSS as JSON:
+
+    python benchmarks/bench_load.py --requests 20000 --concurrency 64 --error-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import resource
+import sys
+from random import Random
+from time import perf_counter
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from aiohttp_catcher import Catcher
+from aiohttp_catcher.canned import AIOHTTP_SCENARIOS
+
+MODES = ("without_catcher", "with_catcher")
+ERRORS = (web.HTTPNotFound, web.HTTPConflict, web.HTTPServiceUnavailable)
+
+
+async def ok_handler(request: web.Request) -> web.Response:  # pylint: disable=unused-argument
+    return web.json_response({"result": "OK"})
+
+
+async def failing_handler(request: web.Request) -> web.Response:
+    raise ERRORS[int(request.match_info["n"]) % len(ERRORS)]()
+
+
+async def build_app(mode: str, freeze: bool) -> web.Application:
+    middlewares = []
+    if mode == "with_catcher":
+        catcher = Catcher()
+        await catcher.add_scenarios(*AIOHTTP_SCENARIOS)
+        if freeze:
+            catcher.freeze()
+        middlewares.append(catcher.middleware)
+    app = web.Application(middlewares=middlewares)
+    app.router.add_get("/ok", ok_handler)
+    app.router.add_get("/fail/{n}", failing_handler)
+    return app
+
+
+def request_mix(requests: int, error_ratio: float, seed: int) -> List[str]:
+    # The same sequence of paths for every mode.
+    rng = Random(seed)
+    return [f"/fail/{i}" if rng.random() < error_ratio else "/ok" for i in range(requests)]
+
+
+def percentile(latencies: List[float], quantile: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * quantile))]
+
+
+def memory_usage() -> Dict[str, int]:
+    # Current and peak resident memory, in kB.
+    usage = {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    try:
+        with open("/proc/self/status") as f:  # pylint: disable=unspecified-encoding
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == "VmRSS":
+                    usage["rss_kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+async def drive(base_url: str, paths: List[str], concurrency: int) -> List[float]:
+    latencies = []
+    pending = iter(paths)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(base_url, connector=connector) as session:
+
+        async def client():
+            for path in pending:
+                started = perf_counter()
+                async with session.get(path) as resp:
+                    await resp.read()
+                latencies.append(perf_counter() - started)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+async def load(mode: str, paths: List[str], warmup: List[str], concurrency: int, freeze: bool) -> Dict:
+    runner = web.AppRunner(await build_app(mode, freeze), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await drive(base_url, warmup, concurrency)
+        started = perf_counter()
+        latencies = sorted(await drive(base_url, paths, concurrency))
+        elapsed = perf_counter() - started
+    finally:
+        await runner.cleanup()
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "p999_ms": percentile(latencies, 0.999) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        **memory_usage(),
+    }
+
+
+def worker(mode: str, paths: List[str], warmup: List[str], concurrency: int, freeze: bool, conn):
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.new_event_loop()
+    try:
+        conn.send(loop.run_until_complete(load(mode, paths, warmup, concurrency, freeze)))
+    finally:
+        loop.close()
+        conn.close()
+
+
+def run(mode: str, paths: List[str], warmup: List[str], concurrency: int, freeze: bool) -> Dict:
+    # Every mode runs in a fresh process, so that its memory usage isn't inflated by the modes before it.
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=worker, args=(mode, paths, warmup, concurrency, freeze, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test an aiohttp application with and without the catcher")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--error-ratio", type=float, default=0.2, help="The share of requests that raise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--freeze", action="store_true", help="Freeze the catcher before serving")
+    parser.add_argument("--output", help="Write the JSON results to a file instead of stdout")
+    args = parser.parse_args()
+
+    paths = request_mix(args.requests, args.error_ratio, args.seed)
+    warmup = request_mix(args.warmup, args.error_ratio, args.seed + 1)
+    results = {mode: run(mode, paths, warmup, args.concurrency, args.freeze) for mode in MODES}
+    baseline, with_catcher = results["without_catcher"], results["with_catcher"]
+    report = {
+        "aiohttp_version": aiohttp.__version__,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "error_ratio": args.error_ratio,
+        "frozen": args.freeze,
+        "results": results,
+        "rps_ratio": with_catcher["rps"] / baseline["rps"],
+        "p99_overhead_ms": with_catcher["p99_ms"] - baseline["p99_ms"],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:  # pylint: disable=unspecified-encoding
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
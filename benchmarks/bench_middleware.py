@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the per-request cost of ``Catcher.middleware``.
+
+Each case invokes the middleware directly with a mocked request, on a local event loop, and compares it to
+invoking the bare handler.  Results are written as JSON, so they can be compared across versions:
+
+    python benchmarks/bench_middleware.py --iterations 20000 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+from time import perf_counter_ns
+from typing import Callable, Dict, List
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from aiohttp_catcher import catch, Catcher
+from aiohttp_catcher.canned import AIOHTTP_SCENARIOS
+
+
+class BenchmarkError(Exception):
+    error_code = "BENCHMARK_ERROR"
+
+
+class UnhandledBenchmarkError(Exception):
+    pass
+
+
+def get_version() -> str:
+    try:
+        from importlib.metadata import version  # pylint: disable=import-outside-toplevel
+        return version("aiohttp-catcher")
+    except Exception:
+        return "unknown"
+
+
+async def ok_handler(request: web.Request) -> web.Response:  # pylint: disable=unused-argument
+    return web.Response(text="OK")
+
+
+def raising(exc_factory: Callable[[], Exception]) -> Callable:
+    async def handler(request: web.Request) -> web.Response:  # pylint: disable=unused-argument
+        raise exc_factory()
+    return handler
+
+
+async def async_message(exc: Exception, request: web.Request) -> str:  # pylint: disable=unused-argument
+    return f"Async: {exc}"
+
+
+async def build_cases() -> Dict[str, Dict]:
+    scenarios = {
+        "constant": catch(BenchmarkError).with_status_code(400).and_return("Constant message"),
+        "stringify": catch(BenchmarkError).with_status_code(400).and_stringify(),
+        "sync_callable": catch(BenchmarkError).with_status_code(400).and_call(lambda exc, req: f"Sync: {exc}"),
+        "async_callable": catch(BenchmarkError).with_status_code(400).and_call(async_message),
+        "dict_additional_fields": catch(BenchmarkError).with_status_code(400).and_stringify()
+        .with_additional_fields({"error_code": "BENCHMARK_ERROR"}),
+        "callable_additional_fields": catch(BenchmarkError).with_status_code(400).and_stringify()
+        .with_additional_fields(lambda exc, req: {"error_code": exc.error_code, "method": req.method}),
+    }
+    cases = {"no_exception": {"scenarios": [], "handler": ok_handler}}
+    for name, scenario in scenarios.items():
+        cases[name] = {"scenarios": [scenario], "handler": raising(lambda: BenchmarkError("Benchmark error"))}
+    cases["unhandled_exception"] = {
+        "scenarios": [], "handler": raising(lambda: UnhandledBenchmarkError("Unhandled"))
+    }
+    cases["canned_aiohttp_scenarios"] = {"scenarios": AIOHTTP_SCENARIOS, "handler": raising(web.HTTPNotFound)}
+    return cases
+
+
+async def time_calls(call: Callable, iterations: int) -> List[int]:
+    timings = []
+    for _ in range(iterations):
+        started = perf_counter_ns()
+        await call()
+        timings.append(perf_counter_ns() - started)
+    return timings
+
+
+def summarize(timings: List[int]) -> Dict:
+    timings = sorted(timings)
+    return {
+        "mean_ns": sum(timings) / len(timings),
+        "p50_ns": timings[len(timings) // 2],
+        "p99_ns": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+async def run_case(case: Dict, iterations: int, warmup: int, freeze: bool) -> Dict:
+    catcher = Catcher()
+    await catcher.add_scenarios(*case["scenarios"])
+    if freeze:
+        catcher.freeze()
+    handler = case["handler"]
+    catcher_middleware = catcher.middleware
+    request = make_mocked_request("GET", "/benchmark")
+
+    async def call_raw():
+        try:
+            return await handler(request)
+        except Exception as exc:
+            return exc
+
+    async def call_middleware():
+        return await catcher_middleware(request, handler)
+
+    await time_calls(call_raw, warmup)
+    await time_calls(call_middleware, warmup)
+    raw = summarize(await time_calls(call_raw, iterations))
+    with_catcher = summarize(await time_calls(call_middleware, iterations))
+    return {
+        "raw": raw,
+        "middleware": with_catcher,
+        "overhead_ns": with_catcher["mean_ns"] - raw["mean_ns"],
+    }
+
+
+async def run(iterations: int, warmup: int, freeze: bool, only: List[str]) -> Dict:
+    cases = await build_cases()
+    results = {}
+    for name, case in cases.items():
+        if only and name not in only:
+            continue
+        results[name] = await run_case(case, iterations, warmup, freeze)
+    return {
+        "aiohttp_catcher_version": get_version(),
+        "aiohttp_version": aiohttp.__version__,
+        "python_version": platform.python_version(),
+        "iterations": iterations,
+        "frozen": freeze,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the aiohttp-catcher middleware")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--freeze", action="store_true", help="Freeze the catcher before benchmarking")
+    parser.add_argument("--case", action="append", default=[], help="Only run the given case(s)")
+    parser.add_argument("--output", help="Write the JSON results to a file instead of stdout")
+    args = parser.parse_args()
+
+    # Unhandled exceptions are logged with their traceback; keep the cost, but not the noise:
+    with open(os.devnull, "w") as devnull:  # pylint: disable=unspecified-encoding
+        catcher_logger = logging.getLogger("aiohttp_catcher")
+        catcher_logger.addHandler(logging.StreamHandler(devnull))
+        catcher_logger.propagate = False
+
+        loop = asyncio.new_event_loop()
+        try:
+            report = loop.run_until_complete(run(args.iterations, args.warmup, args.freeze, args.case))
+        finally:
+            loop.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:  # pylint: disable=unspecified-encoding
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
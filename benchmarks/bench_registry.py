@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup time and memory of pre-forked workers, with large numbers of scenarios.
+
+Compares workers that rebuild their scenarios with awaited ``add_scenarios`` calls to workers sharing a
+``ScenarioRegistry`` built once in the parent process.  Either way, workers freeze their catcher - compiling every
+scenario - as part of their startup.  Results are written as JSON:
+
+    python benchmarks/bench_registry.py --scenarios 5000 --workers 4
+"""
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import sys
+from time import perf_counter
+from typing import Dict, List
+
+from aiohttp_catcher import Catcher, ScenarioRegistry
+
+MODES = ("rebuild", "registry")
+
+
+def build_catalog(size: int) -> List[Dict]:
+    # Stands for an error catalog: one exception type and one scenario per entry.
+    module = sys.modules[__name__]
+    catalog = []
+    for i in range(size):
+        exc_type = type(f"CatalogError{i}", (Exception,), {"__module__": __name__})
+        setattr(module, exc_type.__name__, exc_type)
+        catalog.append({
+            "exceptions": [exc_type],
+            "constant": f"Catalog error #{i}",
+            "status_code": 400 + i % 100,
+            "additional_fields": {"error_code": f"E{i:06d}"},
+        })
+    return catalog
+
+
+def memory_usage() -> Dict[str, int]:
+    # Resident and private (dirtied after fork) memory, in kB, as reported by Linux.
+    usage = {}
+    for path, fields in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Private_Dirty",))):
+        try:
+            with open(path) as f:  # pylint: disable=unspecified-encoding
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name in fields:
+                        usage[name] = int(value.split()[0])
+        except OSError:
+            pass
+    return usage
+
+
+def worker(mode: str, catalog: List[Dict], registry: ScenarioRegistry, conn):
+    started = perf_counter()
+    if mode == "rebuild":
+        catcher = Catcher()
+        asyncio.new_event_loop().run_until_complete(catcher.add_scenarios(*catalog))
+    else:
+        catcher = Catcher(registry=registry)
+    # Both modes compile every scenario the same way, as part of their startup:
+    catcher.freeze()
+    startup = perf_counter() - started
+    # Resolve every exception type once, as a warmed-up worker would have:
+    for entry in catalog:
+        catcher.resolve(entry["exceptions"][0])
+    conn.send({"startup_seconds": startup, **memory_usage()})
+    conn.close()
+
+
+def run(mode: str, catalog: List[Dict], workers: int) -> Dict:
+    registry = None
+    parent_started = perf_counter()
+    if mode == "registry":
+        registry = ScenarioRegistry.build(catalog)
+        # Keep the garbage collector from touching - and thereby copying - the objects shared with the workers:
+        gc.freeze()
+    parent_build = perf_counter() - parent_started
+
+    context = multiprocessing.get_context("fork")
+    results = []
+    for _ in range(workers):
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(target=worker, args=(mode, catalog, registry, child_conn))
+        process.start()
+        results.append(parent_conn.recv())
+        process.join()
+    if mode == "registry":
+        gc.unfreeze()
+    return {
+        "parent_build_seconds": parent_build,
+        "workers": results,
+        "mean_startup_seconds": sum(r["startup_seconds"] for r in results) / len(results),
+        "mean_private_dirty_kb": sum(r.get("Private_Dirty", 0) for r in results) / len(results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker startup with large scenario registries")
+    parser.add_argument("--scenarios", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="Write the JSON results to a file instead of stdout")
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.scenarios)
+    report = {
+        "scenarios": args.scenarios,
+        "results": {mode: run(mode, catalog, args.workers) for mode in MODES},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:  # pylint: disable=unspecified-encoding
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
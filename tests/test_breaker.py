@@ -0,0 +1,53 @@
+from aiohttp import web
+
+from aiohttp_catcher import catch, Catcher, CircuitBreaker
+
+
+class TestCircuitBreaker:
+
+    @staticmethod
+    async def test_short_circuit_failing_route(aiohttp_client, loop):
+        calls = []
+
+        async def divide(request):
+            calls.append(request.path)
+            return web.json_response({"result": 1 / 0})
+
+        async def healthy(request):
+            return web.json_response({"result": "OK"})
+
+        catcher = Catcher().use_breaker(CircuitBreaker(threshold=3, window=10.0, cooldown=60.0))
+        await catcher.add_scenario(catch(ZeroDivisionError).with_status_code(502).and_return("Upstream failed"))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/divide", divide)
+        app.router.add_get("/healthy", healthy)
+
+        client = await aiohttp_client(app)
+        for _ in range(3):
+            resp = await client.get("/divide")
+            assert 502 == resp.status
+        assert 3 == len(calls)
+
+        resp = await client.get("/divide")
+        assert 503 == resp.status
+        assert {"message": "Service temporarily unavailable", "code": 503} == await resp.json()
+        assert 0 < int(resp.headers["Retry-After"]) <= 60
+        assert 3 == len(calls)
+
+        resp = await client.get("/healthy")
+        assert 200 == resp.status
+
+    @staticmethod
+    async def test_ignore_client_errors(aiohttp_client, loop):
+        async def divide(request):
+            return web.json_response({"result": 1 / 0})
+
+        catcher = Catcher().use_breaker(CircuitBreaker(threshold=2))
+        await catcher.add_scenario(catch(ZeroDivisionError).with_status_code(400).and_return("Zero division"))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/divide", divide)
+
+        client = await aiohttp_client(app)
+        for _ in range(4):
+            resp = await client.get("/divide")
+            assert 400 == resp.status
@@ -0,0 +1,57 @@
+from aiohttp import web
+
+from aiohttp_catcher import catch, Catcher, ErrorBudget
+
+
+class TestErrorBudget:
+
+    @staticmethod
+    async def test_burn_rate_hooks(aiohttp_client, routes, loop):
+        budget = ErrorBudget(slo=0.75, windows=((60.0, 2.0), (120.0, 1.5)), granularity=60.0, min_requests=4)
+        burning = []
+        budget.add_hook(lambda route, window, burn_rate, errors, total: burning.append((route, window, errors, total)))
+        catcher = Catcher().use_budget(budget)
+        await catcher.add_scenario(catch(IndexError).with_status_code(400))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+        app.on_cleanup.append(budget.on_cleanup)
+
+        client = await aiohttp_client(app)
+        for n in (1, 2, 3, 4, 100):
+            await client.get(f"/get-element-n?n={n}")
+        for _ in range(3):
+            await client.get("/divide?a=1&b=0")
+        await client.get("/divide?a=1&b=1")
+        assert {"/get-element-n": {60.0: 0.0, 120.0: 0.0}, "/divide": {60.0: 3.0, 120.0: 3.0}} == budget.snapshot()
+
+        budget.tick()
+        assert [("/divide", 60.0, 3, 4), ("/divide", 120.0, 3, 4)] == burning
+        # Hooks are only called again once the burn rate has dropped below the threshold:
+        for _ in range(12):
+            await client.get("/divide?a=1&b=1")
+        assert {60.0: 0.0, 120.0: 0.75} == budget.snapshot()["/divide"]
+        budget.tick()
+        assert 2 == len(burning)
+        # The oldest slot is recycled:
+        assert {60.0: 0.0, 120.0: 0.0} == budget.snapshot()["/divide"]
+
+    @staticmethod
+    async def test_count_returned_errors(aiohttp_client, loop):
+        async def unavailable(request):
+            return web.json_response({"message": "Try again later"}, status=503)
+
+        async def healthy(request):
+            return web.json_response({"message": "OK"})
+
+        budget = ErrorBudget(slo=0.75, windows=((60.0, 2.0),), granularity=60.0)
+        catcher = Catcher().use_budget(budget)
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/unavailable", unavailable)
+        app.router.add_get("/healthy", healthy)
+        app.on_cleanup.append(budget.on_cleanup)
+
+        client = await aiohttp_client(app)
+        for path in ("/unavailable", "/unavailable", "/healthy"):
+            await client.get(path)
+        # Error responses returned by handlers spend the budget, too:
+        assert {"/unavailable": {60.0: 4.0}, "/healthy": {60.0: 0.0}} == budget.snapshot()
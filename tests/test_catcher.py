@@ -1,8 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import asyncio
+import json
+import time
+import threading
+
 from aiohttp import web
+import pytest
 
+from aiohttp.test_utils import make_mocked_request
 from aiohttp.web import Request
-from aiohttp_catcher import catch, Catcher
-from aiohttp_catcher.canned import AIOHTTP_SCENARIOS
+from aiohttp_catcher import catch, Catcher, CatcherFrozenError, exc_attr, header, match_info, Metrics, RenderDeadline, \
+    req_method, req_path
+from aiohttp_catcher.canned import AIOHTTP_SCENARIO, AIOHTTP_SCENARIOS
+from aiohttp_catcher.canned.aiohttp_errors import HTTPExceptionScenario
 from conftest import AppClientError, EntityNotFound
 from dicttoxml import dicttoxml
 
@@ -277,3 +288,376 @@ class TestCatcher:
         resp = await client.delete("/user/1009")
         assert 405 == resp.status
         assert {"message": "HTTPMethodNotAllowed", "code": 405} == await resp.json()
+
+    @staticmethod
+    async def test_resolve_nearest_registered_ancestor(aiohttp_client, loop):
+        class BaseError(Exception):
+            pass
+
+        class ChildError(BaseError):
+            pass
+
+        class GrandchildError(ChildError):
+            pass
+
+        async def raise_grandchild(request):
+            raise GrandchildError("grandchild")
+
+        catcher = Catcher()
+        await catcher.add_scenario(catch(BaseError).with_status_code(409).and_return("base"))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/grandchild", raise_grandchild)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/grandchild")
+        assert 409 == resp.status
+        assert "base" == (await resp.json()).get("message")
+        assert catcher.resolve(GrandchildError) is catcher.resolve(BaseError)
+
+        # Registering a closer ancestor must invalidate the cached resolution:
+        await catcher.add_scenario(catch(ChildError).with_status_code(410).and_return("child"))
+        resp = await client.get("/grandchild")
+        assert 410 == resp.status
+        assert "child" == (await resp.json()).get("message")
+
+    @staticmethod
+    async def test_static_scenario_body_encoded_once(aiohttp_client, routes, loop, mocker):
+        encoder = mocker.Mock(side_effect=json.dumps)
+        catcher = Catcher(encoder=encoder)
+        await catcher.add_scenario(
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense")
+            .with_additional_fields({"error_code": "ZERO_DIVISION"})
+        )
+        encoder.reset_mock()
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        for _ in range(3):
+            resp = await client.get("/divide?a=10&b=0")
+            assert 400 == resp.status
+            assert "application/json" == resp.content_type
+            assert {"message": "Zero division makes zero sense", "code": 400, "error_code": "ZERO_DIVISION"} \
+                == await resp.json()
+        encoder.assert_not_called()
+
+    @staticmethod
+    async def test_frozen_catcher(aiohttp_client, routes, loop):
+        catcher = Catcher()
+
+        async def async_callable(exc, req):
+            return f"Out of bound: {str(exc)}"
+
+        await catcher.add_scenarios(
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+            catch(IndexError).with_status_code(418).and_call(async_callable),
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields({"foo": "bar"}),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.on_startup.append(catcher.on_startup)
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        assert catcher.frozen
+        assert catcher.compile_time is not None
+        with pytest.raises(CatcherFrozenError):
+            await catcher.add_scenario(catch(KeyError).with_status_code(400))
+        with pytest.raises(CatcherFrozenError):
+            catcher.use_deadline(RenderDeadline())
+        with pytest.raises(CatcherFrozenError):
+            catcher.add_phase_hook("resolution", lambda scenario, duration, request: None)
+
+        resp = await client.get("/divide?a=10&b=0")
+        assert 400 == resp.status
+        assert "Zero division makes zero sense" == (await resp.json()).get("message")
+
+        resp = await client.get("/get-element-n?n=100")
+        assert 418 == resp.status
+        assert "Out of bound: range object index out of range" == (await resp.json()).get("message")
+
+        resp = await client.get("/user/1009")
+        assert 404 == resp.status
+        assert {"message": "User ID 1009 could not be found", "code": 404, "foo": "bar"} == await resp.json()
+
+    @staticmethod
+    async def test_catchers_do_not_share_scenarios(aiohttp_client, routes, loop):
+        first, second = Catcher(), Catcher()
+        await first.add_scenario(catch(ZeroDivisionError).with_status_code(400).and_return("first"))
+        await second.add_scenario(catch(ZeroDivisionError).with_status_code(418).and_return("second"))
+        assert first.scenario_map is not second.scenario_map
+
+        app = web.Application(middlewares=[first.middleware])
+        app.add_routes(routes)
+        client = await aiohttp_client(app)
+        resp = await client.get("/divide?a=10&b=0")
+        assert 400 == resp.status
+        assert "first" == (await resp.json()).get("message")
+
+    @staticmethod
+    async def test_scoped_scenarios(aiohttp_client, loop):
+        async def divide(request):
+            return web.json_response({"result": 1 / 0})
+
+        catcher = Catcher()
+        app = web.Application(middlewares=[catcher.middleware])
+        route = app.router.add_get("/divide", divide)
+        app.router.add_get("/divide-again", divide)
+        sub_app = web.Application()
+        sub_app.router.add_get("/divide", divide)
+        app.add_subapp("/v2", sub_app)
+
+        await catcher.add_scenario(catch(ArithmeticError).with_status_code(400).and_return("global"))
+        await catcher.add_scenario(catch(ZeroDivisionError).with_status_code(418).and_return("route"), scope=route)
+        await catcher.add_scenario(catch(ArithmeticError).with_status_code(422).and_return("sub-app"), scope=sub_app)
+
+        client = await aiohttp_client(app)
+        for path, status, message in [("/divide", 418, "route"), ("/divide-again", 400, "global"),
+                                      ("/v2/divide", 422, "sub-app"), ("/divide", 418, "route")]:
+            resp = await client.get(path)
+            assert status == resp.status
+            assert message == (await resp.json()).get("message")
+
+    @staticmethod
+    async def test_negotiate_encoders(aiohttp_client, routes, loop):
+        catcher = Catcher(encoders={"application/xml": lambda data: dicttoxml(data, attr_type=False)})
+        await catcher.add_scenarios(
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+            catch(EntityNotFound).with_status_code(404).and_stringify(),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        for path, message in [("/divide?a=10&b=0", "Zero division makes zero sense"),
+                              ("/user/1009", "User ID 1009 could not be found")]:
+            resp = await client.get(path, headers={"Accept": "application/xml"})
+            assert "application/xml" == resp.content_type
+            assert f"<message>{message}</message>" in await resp.text()
+
+            resp = await client.get(path, headers={"Accept": "text/html, application/json;q=0.9"})
+            assert "application/json" == resp.content_type
+            assert message == (await resp.json()).get("message")
+
+            resp = await client.get(path, headers={"Accept": "text/html"})
+            assert "application/json" == resp.content_type
+
+    @staticmethod
+    async def test_offload_sync_callables(aiohttp_client, routes, loop):
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="catcher")
+        catcher = Catcher()
+        await catcher.add_scenario(
+            catch(EntityNotFound).with_status_code(404).and_call(
+                lambda exc, req: f"{str(exc)} ({threading.current_thread().name})"
+            ).with_additional_fields(
+                lambda exc, req: {"method": req.method, "thread": threading.current_thread().name}
+            ).in_executor(executor, max_pending=1)
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/user/1009")
+        assert 404 == resp.status
+        body = await resp.json()
+        assert body.get("message").startswith("User ID 1009 could not be found (catcher")
+        assert "GET" == body.get("method")
+        assert body.get("thread").startswith("catcher")
+
+    @staticmethod
+    async def test_canned_aiohttp_status_dispatch(aiohttp_client, loop):
+        class TeapotError(web.HTTPBadRequest):
+            pass
+
+        async def teapot(request):
+            raise TeapotError()
+
+        async def redirect(request):
+            raise web.HTTPFound("/teapot")
+
+        async def unavailable(request):
+            raise web.HTTPServiceUnavailable()
+
+        class InvalidPayloadError(web.HTTPClientError):
+            pass
+
+        async def invalid_payload(request):
+            raise InvalidPayloadError()
+
+        catcher = Catcher()
+        await catcher.add_scenario(AIOHTTP_SCENARIO)
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/teapot", teapot)
+        app.router.add_get("/redirect", redirect)
+        app.router.add_get("/unavailable", unavailable)
+        app.router.add_get("/invalid-payload", invalid_payload)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/teapot")
+        assert 400 == resp.status
+        assert {"message": "TeapotError", "code": 400} == await resp.json()
+
+        resp = await client.get("/unavailable")
+        assert 503 == resp.status
+        assert {"message": "HTTPServiceUnavailable", "code": 503} == await resp.json()
+
+        # Exceptions with no status code of their own take their family's:
+        resp = await client.get("/invalid-payload")
+        assert 400 == resp.status
+        assert {"message": "InvalidPayloadError", "code": 400} == await resp.json()
+        assert 500 == AIOHTTP_SCENARIO.specialize(web.HTTPServerError).status_code
+        assert AIOHTTP_SCENARIO.specialize(web.HTTPRedirection).reraise
+
+        resp = await client.get("/redirect", allow_redirects=False)
+        assert 302 == resp.status
+        assert "/teapot" == resp.headers["Location"]
+
+    @staticmethod
+    async def test_canned_aiohttp_builders(aiohttp_client, loop):
+        calls = []
+
+        def message(exc, request):
+            calls.append(exc.status_code)
+            return f"{exc.status_code}: {exc.reason}"
+
+        async def not_found(request):
+            raise web.HTTPNotFound()
+
+        async def gone(request):
+            raise web.HTTPGone()
+
+        scenario = HTTPExceptionScenario().and_call(message).with_cache(lambda exc, request: exc.status_code) \
+            .with_priority(2).with_additional_fields({"canned": True})
+        with pytest.raises(TypeError):
+            scenario.with_status_code(400)
+        catcher = Catcher()
+        await catcher.add_scenario(scenario)
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/not-found", not_found)
+        app.router.add_get("/gone", gone)
+
+        client = await aiohttp_client(app)
+        for _ in range(2):
+            resp = await client.get("/not-found")
+            assert 404 == resp.status
+            assert {"message": "404: Not Found", "code": 404, "canned": True} == await resp.json()
+        resp = await client.get("/gone")
+        assert {"message": "410: Gone", "code": 410, "canned": True} == await resp.json()
+        # Every exception type shares the scenario's cache:
+        assert [404, 410] == calls
+        assert 2 == scenario.specialize(web.HTTPGone).priority
+
+    @staticmethod
+    async def test_reraise(aiohttp_client, routes, loop):
+        @web.middleware
+        async def outer_middleware(request, handler):
+            try:
+                return await handler(request)
+            except ZeroDivisionError:
+                return web.json_response({"caught_by": "outer"}, status=418)
+
+        catcher = Catcher()
+        await catcher.add_scenario(catch(ZeroDivisionError).and_reraise())
+        app = web.Application(middlewares=[outer_middleware, catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/divide?a=10&b=0")
+        assert 418 == resp.status
+        assert {"caught_by": "outer"} == await resp.json()
+
+    @staticmethod
+    async def test_additional_fields_templates(aiohttp_client, routes, loop):
+        catcher = Catcher(encoders={"application/xml": dicttoxml})
+        await catcher.add_scenarios(
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields({
+                "request_id": header("X-Request-ID"),
+                "service": "users",
+                "path": req_path(),
+                "method": req_method(),
+                "user_id": match_info("id"),
+                "error_code": exc_attr("error_code"),
+            }),
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense")
+            .with_additional_fields({"message": req_path()}),
+            catch(IndexError).with_status_code(400).and_return("Out of range")
+            .with_additional_fields({1: "one", "request_id": header("X-Request-ID")}),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/user/1009", headers={"X-Request-ID": "abc-123"})
+        assert 404 == resp.status
+        expected = {
+            "message": "User ID 1009 could not be found",
+            "code": 404,
+            "request_id": "abc-123",
+            "service": "users",
+            "path": "/user/1009",
+            "method": "GET",
+            "user_id": "1009",
+            "error_code": "ENTITY_NOT_FOUND",
+        }
+        # Pre-serialized around its dynamic values, the body is the same as it would be if encoded as a whole:
+        assert json.dumps(expected) == await resp.text()
+        resp = await client.get("/user/1009", headers={"Accept": "application/xml"})
+        assert b"<path type=\"str\">/user/1009</path>" in await resp.read()
+        # Templated fields overriding the envelope are merged, rather than pre-serialized:
+        resp = await client.get("/divide?a=10&b=0")
+        assert {"message": "/divide", "code": 400} == await resp.json()
+        # So are templates with keys that aren't strings, which are encoded as strings:
+        resp = await client.get("/get-element-n?n=100", headers={"X-Request-ID": "abc-123"})
+        assert {"message": "Out of range", "code": 400, "1": "one", "request_id": "abc-123"} == \
+            json.loads(await resp.text())
+
+    @staticmethod
+    @pytest.mark.parametrize("metrics", [None, Metrics()])
+    async def test_render_deadline(aiohttp_client, routes, loop, metrics):
+        calls = []
+
+        async def slow_message(exc, request):
+            calls.append(request.path)
+            await asyncio.sleep(float(request.query.get("sleep", 0)))
+            return str(exc)
+
+        catcher = Catcher().use_deadline(RenderDeadline(timeout=0.05))
+        if metrics is not None:
+            catcher.use_metrics(metrics)
+        await catcher.add_scenarios(
+            catch(EntityNotFound).with_status_code(404).and_call(slow_message),
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/user/1009")
+        assert {"message": "User ID 1009 could not be found", "code": 404} == await resp.json()
+        # Callables running past the timeout are cancelled:
+        resp = await client.get("/user/1009?sleep=1")
+        assert 404 == resp.status
+        assert {"message": "Not Found", "code": 404} == await resp.json()
+        # Callables aren't called once the request's deadline has passed:
+        resp = await client.get("/user/1009", headers={"X-Request-Deadline": str(time.time() - 1)})
+        assert {"message": "Not Found", "code": 404} == await resp.json()
+        assert 2 == len(calls)
+        # Static responses are sent as they are:
+        resp = await client.get("/divide?a=10&b=0", headers={"X-Request-Deadline": str(time.time() - 1)})
+        assert {"message": "Zero division makes zero sense", "code": 400} == await resp.json()
+
+    @staticmethod
+    async def test_skip_disconnected(loop):
+        catcher = Catcher().use_deadline(RenderDeadline())
+        get_message = mock.Mock(return_value="Not rendered")
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_call(get_message))
+        transport = mock.Mock()
+        transport.is_closing.return_value = True
+        request = make_mocked_request("GET", "/user/1009", transport=transport)
+
+        async def handler(request):
+            raise EntityNotFound("User ID 1009 could not be found")
+
+        response = await catcher.middleware(request, handler)
+        assert 404 == response.status
+        assert {"message": "Not Found", "code": 404} == json.loads(response.body)
+        get_message.assert_not_called()
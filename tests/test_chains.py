@@ -0,0 +1,114 @@
+import builtins
+
+from aiohttp import web
+import pytest
+
+from aiohttp_catcher import catch, Catcher, ChainResolution
+from aiohttp_catcher.chains import walk
+from conftest import EntityNotFound
+
+
+class WrapperError(Exception):
+    pass
+
+
+def chained(depth: int) -> Exception:
+    try:
+        try:
+            raise KeyError("root")
+        except KeyError as e:
+            raise ValueError("middle") from e
+    except ValueError as e:
+        exc = e
+    for i in range(depth):
+        try:
+            raise WrapperError(f"wrapper {i}") from exc
+        except WrapperError as e:
+            exc = e
+    return exc
+
+
+class TestChainResolution:
+
+    @staticmethod
+    def test_walk_is_bounded():
+        exc = chained(depth=3)
+        assert [WrapperError, WrapperError, WrapperError, ValueError, KeyError] == \
+            [type(node) for node in walk(exc, max_depth=10, max_nodes=10)]
+        assert 3 == len(walk(exc, max_depth=2, max_nodes=10))
+        assert 2 == len(walk(exc, max_depth=10, max_nodes=2))
+
+    @staticmethod
+    async def test_resolve_causes(aiohttp_client, loop):
+        async def wrapped(request):
+            try:
+                raise EntityNotFound("User ID 1009 could not be found")
+            except EntityNotFound as e:
+                raise WrapperError("Something went wrong") from e
+
+        async def wrapped_key_error(request):
+            try:
+                {}["missing"]
+            except KeyError as e:
+                raise WrapperError("Something went wrong") from e
+
+        catcher = Catcher().use_chain_resolution(ChainResolution(max_depth=2))
+        await catcher.add_scenarios(
+            catch(WrapperError).with_status_code(500).and_stringify(),
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_priority(1),
+            catch(KeyError).with_status_code(400).and_return("Missing key"),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/wrapped", wrapped)
+        app.router.add_get("/wrapped-key-error", wrapped_key_error)
+
+        client = await aiohttp_client(app)
+        for _ in range(2):
+            resp = await client.get("/wrapped")
+            assert 404 == resp.status
+            assert "User ID 1009 could not be found" == (await resp.json()).get("message")
+        # Ties go to the outermost exception:
+        resp = await client.get("/wrapped-key-error")
+        assert 500 == resp.status
+        assert "Something went wrong" == (await resp.json()).get("message")
+
+    @staticmethod
+    @pytest.mark.skipif(not hasattr(builtins, "ExceptionGroup"), reason="Exception groups require Python 3.11")
+    async def test_resolve_exception_groups(aiohttp_client, loop):
+        async def grouped(request):
+            raise builtins.ExceptionGroup("Several failures", [ValueError("bad value"), EntityNotFound("Not found")])
+
+        catcher = Catcher().use_chain_resolution(ChainResolution())
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/grouped", grouped)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/grouped")
+        assert 404 == resp.status
+        assert "Not found" == (await resp.json()).get("message")
+
+    @staticmethod
+    async def test_rank_selected_scenarios(loop):
+        class CodedError(Exception):
+            def __init__(self, code):
+                super().__init__(f"Error code {code}")
+                self.code = code
+
+        catcher = Catcher().use_chain_resolution(ChainResolution())
+        await catcher.add_scenarios(
+            catch(CodedError, code=1).with_status_code(409).and_stringify().with_priority(10),
+            catch(CodedError).with_status_code(500).and_stringify(),
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_priority(5),
+        )
+        for code, status in ((1, 409), (2, 404)):
+            try:
+                try:
+                    raise EntityNotFound("Not found")
+                except EntityNotFound as e:
+                    raise CodedError(code) from e
+            except CodedError as e:
+                exc = e
+            # The priority of the scenario selected for the exception is ranked, not the highest of its type's:
+            scenario, _ = catcher.chain_resolution.resolve(catcher, exc)
+            assert status == scenario.status_code
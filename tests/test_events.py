@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from aiohttp_catcher import CallbackSink, catch, Catcher, ErrorEventExporter, JsonLinesSink, UnixSocketSink
+from aiohttp_catcher.events import DROP_OLDEST, snapshot
+from conftest import EntityNotFound
+
+
+def _raise(exc):
+    raise exc
+
+
+class TestErrorEvents:
+
+    @staticmethod
+    def test_snapshot_is_frame_free():
+        try:
+            _raise(EntityNotFound("User ID 3 could not be found"))
+        except EntityNotFound as exc:
+            captured = snapshot(exc)
+        assert "conftest.EntityNotFound" == captured["type"]
+        assert "User ID 3 could not be found" == captured["message"]
+        assert ["test_snapshot_is_frame_free", "_raise"] == [frame["function"] for frame in captured["frames"]]
+        json.dumps(captured)
+
+    @staticmethod
+    async def test_events_exported_in_batches(aiohttp_client, routes, loop):
+        batches = []
+        exporter = ErrorEventExporter(sinks=[CallbackSink(batches.append)], batch_size=2, linger=0.01)
+        catcher = Catcher().use_exporter(exporter)
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+        app.on_cleanup.append(exporter.on_cleanup)
+
+        client = await aiohttp_client(app)
+        for _ in range(3):
+            assert 404 == (await client.get("/user/1009")).status
+        assert 500 == (await client.get("/divide?a=1&b=0")).status
+        await exporter.stop()
+
+        events = [event for batch in batches for event in batch]
+        assert all(len(batch) <= 2 for batch in batches)
+        assert 4 == len(events) == exporter.exported
+        event = events[0]
+        assert "conftest.EntityNotFound" == event["scenario"]
+        assert 404 == event["status"]
+        assert "GET" == event["method"]
+        assert "/user/{id}" == event["route"]
+        assert "/user/1009" == event["path"]
+        assert {"resolution", "additional_fields", "message", "encoding"} == set(event["timings"])
+        assert "User ID 1009 could not be found" == event["exception"]["message"]
+        assert "unhandled" == events[-1]["scenario"]
+        assert "builtins.ZeroDivisionError" == events[-1]["exception"]["type"]
+
+    @staticmethod
+    async def test_overflow_policies(loop):
+        for overflow, expected in (("drop_newest", [0, 1]), (DROP_OLDEST, [2, 3])):
+            batches = []
+            exporter = ErrorEventExporter(sinks=[CallbackSink(batches.append)], max_queue_size=2, overflow=overflow)
+            exporter.start()
+            for i in range(4):
+                exporter.put({"i": i})
+            await exporter.stop()
+            assert expected == [event["i"] for batch in batches for event in batch]
+            assert 2 == exporter.dropped
+
+    @staticmethod
+    async def test_failing_sink_does_not_stop_export(loop):
+        batches = []
+
+        async def fail(events):
+            raise ConnectionError("collector is down")
+
+        exporter = ErrorEventExporter(sinks=[CallbackSink(fail), CallbackSink(batches.append)], linger=0)
+        exporter.start()
+        exporter.put({"i": 0})
+        await exporter.stop()
+        assert [[{"i": 0}]] == batches
+
+    @staticmethod
+    async def test_json_lines_and_unix_socket_sinks(tmp_path, loop):
+        received = []
+
+        async def on_connection(reader, writer):
+            received.extend([json.loads(line) async for line in reader])
+            writer.close()
+
+        socket_path = str(tmp_path / "events.sock")
+        server = await asyncio.start_unix_server(on_connection, socket_path)
+        file_path = tmp_path / "events.jsonl"
+        exporter = ErrorEventExporter(sinks=[JsonLinesSink(str(file_path)), UnixSocketSink(socket_path)])
+        exporter.start()
+        exporter.put({"i": 0})
+        exporter.put({"i": 1})
+        await exporter.stop()
+        server.close()
+        await server.wait_closed()
+        await asyncio.sleep(0.01)
+        assert [{"i": 0}, {"i": 1}] == [json.loads(line) for line in file_path.read_text().splitlines()]
+        assert [{"i": 0}, {"i": 1}] == received
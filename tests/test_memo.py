@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+from aiohttp import web
+import pytest
+
+from aiohttp_catcher import catch, Catcher, RenderDeadline
+from aiohttp_catcher.memo import Memo
+from conftest import EntityNotFound
+
+
+class TestMemo:
+
+    @staticmethod
+    async def test_coalesce_concurrent_misses(loop):
+        calls = []
+
+        async def lookup(exc, request):
+            calls.append(exc)
+            await asyncio.sleep(0.01)
+            return f"Localized: {exc}"
+
+        memo = Memo(lookup, True, key=lambda exc, request: str(exc))
+        results = await asyncio.gather(*(memo(KeyError("a"), None) for _ in range(10)), memo(KeyError("b"), None))
+        assert ["Localized: 'a'"] * 10 + ["Localized: 'b'"] == results
+        assert 2 == len(calls)
+        assert "Localized: 'a'" == await memo(KeyError("a"), None)
+        assert 2 == len(calls)
+
+    @staticmethod
+    async def test_propagate_failures(loop):
+        calls = []
+
+        async def lookup(exc, request):
+            calls.append(exc)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("Store unavailable")
+
+        memo = Memo(lookup, True, key=lambda exc, request: str(exc))
+        results = await asyncio.gather(*(memo(KeyError("a"), None) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert 1 == len(calls)
+        with pytest.raises(RuntimeError):
+            await memo(KeyError("a"), None)
+        assert 2 == len(calls)
+
+    @staticmethod
+    async def test_cancel_waiter(loop):
+        calls = []
+
+        async def lookup(exc, request):
+            calls.append(exc)
+            await asyncio.sleep(0.05)
+            return f"Localized: {exc}"
+
+        memo = Memo(lookup, True, key=lambda exc, request: str(exc))
+        leader = asyncio.ensure_future(memo(KeyError("a"), None))
+        waiters = [asyncio.ensure_future(memo(KeyError("a"), None)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        # Cancelling a waiter leaves the call, and the other waiters, alone:
+        assert "Localized: 'a'" == await leader
+        assert "Localized: 'a'" == await waiters[1]
+        assert waiters[0].cancelled()
+        assert 1 == len(calls)
+
+    @staticmethod
+    async def test_cancel_leader(loop):
+        calls = []
+
+        async def lookup(exc, request):
+            calls.append(exc)
+            await asyncio.sleep(0.05)
+            return f"Localized: {exc}"
+
+        memo = Memo(lookup, True, key=lambda exc, request: str(exc))
+        leader = asyncio.ensure_future(memo(KeyError("a"), None))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.ensure_future(memo(KeyError("a"), None)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # One of the waiters makes the call in the cancelled call's stead:
+        assert ["Localized: 'a'"] * 3 == await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        assert 2 == len(calls)
+
+    @staticmethod
+    def test_lru_and_ttl(mocker):
+        now = mocker.patch("aiohttp_catcher.memo.monotonic", return_value=100.0)
+        calls = []
+
+        def lookup(exc, request):
+            calls.append(exc)
+            return str(exc)
+
+        memo = Memo(lookup, False, key=lambda exc, request: str(exc), max_size=2, ttl=10.0)
+        for key in ("a", "b", "a", "c", "a", "b"):
+            memo(key, None)
+        # "b" was evicted by "c", being the least recently used:
+        assert ["a", "b", "c", "b"] == calls
+        now.return_value = 111.0
+        memo("a", None)
+        assert ["a", "b", "c", "b", "a"] == calls
+
+    @staticmethod
+    async def test_scenario_cache(aiohttp_client, routes, loop):
+        calls = []
+
+        async def get_additional_fields(exc, req):
+            calls.append(exc)
+            return {"support_link": f"https://support.example.com/{exc.error_code}"}
+
+        catcher = Catcher()
+        await catcher.add_scenario(
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields(get_additional_fields)
+            .with_cache(key=lambda exc, req: exc.error_code, ttl=60.0)
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        for user_id in ("1009", "1010"):
+            resp = await client.get(f"/user/{user_id}")
+            assert 404 == resp.status
+            body = await resp.json()
+            assert f"User ID {user_id} could not be found" == body.get("message")
+            assert "https://support.example.com/ENTITY_NOT_FOUND" == body.get("support_link")
+        assert 1 == len(calls)
+
+    @staticmethod
+    async def test_scenario_cache_with_render_deadline(aiohttp_client, routes, loop):
+        calls = []
+
+        async def get_additional_fields(exc, req):
+            calls.append(exc)
+            await asyncio.sleep(0.1)
+            return {"support_link": f"https://support.example.com/{req.query['lang']}/{exc.error_code}"}
+
+        catcher = Catcher().use_deadline(RenderDeadline(timeout=1.0))
+        await catcher.add_scenario(
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields(get_additional_fields)
+            .with_cache(key=lambda exc, req: req.query["lang"])
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+
+        async def get_user(user_id, lang, delay, deadline=None):
+            await asyncio.sleep(delay)
+            headers = {} if deadline is None else {"X-Request-Deadline": str(time.time() + deadline)}
+            resp = await client.get(f"/user/{user_id}?lang={lang}", headers=headers)
+            return resp.status, await resp.json()
+
+        def rendered(user_id, lang):
+            return 404, {"message": f"User ID {user_id} could not be found", "code": 404,
+                         "support_link": f"https://support.example.com/{lang}/ENTITY_NOT_FOUND"}
+
+        minimal = 404, {"message": "Not Found", "code": 404}
+        # A request timing out while waiting on another's call leaves it be:
+        results = await asyncio.gather(get_user("2001", "en", 0), get_user("2002", "en", 0.02, 0.05))
+        assert [rendered("2001", "en"), minimal] == results
+        assert 1 == len(calls)
+        # A request timing out while making the call has one of the requests waiting on it make it instead:
+        results = await asyncio.gather(get_user("2001", "fr", 0, 0.05), get_user("2002", "fr", 0.02))
+        assert [minimal, rendered("2002", "fr")] == results
+        assert 3 == len(calls)
+        resp = await client.get("/user/2003?lang=fr", headers={"X-Request-Deadline": str(time.time() + 0.05)})
+        assert rendered("2003", "fr") == (resp.status, await resp.json())
+        assert 3 == len(calls)
@@ -0,0 +1,88 @@
+from aiohttp import web
+import pytest
+
+from aiohttp_catcher import catch, Catcher, Metrics
+from aiohttp_catcher.metrics import Histogram
+from conftest import EntityNotFound
+
+
+class TestMetrics:
+
+    @staticmethod
+    def test_histogram_buckets():
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        assert [("0.1", 2), ("1.0", 3), ("+Inf", 4)] == histogram.cumulative()
+        assert 4 == histogram.count
+
+    @staticmethod
+    async def test_errors_and_latencies(aiohttp_client, routes, loop):
+        metrics = Metrics()
+        catcher = Catcher().use_metrics(metrics)
+
+        async def get_additional_fields(exc, req):
+            return {"method": req.method}
+
+        await catcher.add_scenarios(
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields(get_additional_fields),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+        app.router.add_get("/metrics", metrics.handler)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/divide?a=10&b=0")
+        assert 400 == resp.status
+        assert "Zero division makes zero sense" == (await resp.json()).get("message")
+        resp = await client.get("/user/1009")
+        assert {"message": "User ID 1009 could not be found", "code": 404, "method": "GET"} == await resp.json()
+        resp = await client.get("/user/1009")
+        resp = await client.get("/concat?a=Foo")
+        assert 500 == resp.status
+
+        assert {
+            ("builtins.ZeroDivisionError", 400): 1,
+            ("conftest.EntityNotFound", 404): 2,
+            ("unhandled", 500): 1,
+        } == metrics.errors
+        assert all(4 == histogram.count for histogram in metrics.latencies.values())
+
+        resp = await client.get("/metrics")
+        assert 200 == resp.status
+        text = await resp.text()
+        assert 'aiohttp_catcher_errors_total{scenario="conftest.EntityNotFound",status="404"} 2' in text
+        assert 'aiohttp_catcher_error_path_seconds_count{phase="encoding"} 4' in text
+        assert 'aiohttp_catcher_error_path_seconds_bucket{phase="total",le="+Inf"} 4' in text
+
+    @staticmethod
+    async def test_phase_hooks_and_server_timing(aiohttp_client, routes, loop):
+        catcher = Catcher().use_server_timing()
+        observed = []
+
+        def on_phase(phase):
+            return lambda scenario, duration, request: observed.append((phase, scenario, request.path))
+
+        for phase in ("resolution", "message", "additional_fields", "encoding"):
+            catcher.add_phase_hook(phase, on_phase(phase))
+        catcher.add_phase_hook("encoding", lambda scenario, duration, request: 1 / 0)
+        with pytest.raises(ValueError):
+            catcher.add_phase_hook("get_response_message", on_phase("get_response_message"))
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/user/1009")
+        assert 404 == resp.status
+        assert "User ID 1009 could not be found" == (await resp.json()).get("message")
+        assert [
+            ("resolution", "conftest.EntityNotFound", "/user/1009"),
+            ("message", "conftest.EntityNotFound", "/user/1009"),
+            ("additional_fields", "conftest.EntityNotFound", "/user/1009"),
+            ("encoding", "conftest.EntityNotFound", "/user/1009"),
+        ] == observed
+        server_timing = [metric.split(";dur=") for metric in resp.headers["Server-Timing"].split(", ")]
+        assert ["resolution", "additional_fields", "message", "encoding"] == [name for name, _ in server_timing]
+        assert all(float(duration) >= 0 for _, duration in server_timing)
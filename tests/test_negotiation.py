@@ -0,0 +1,19 @@
+from aiohttp_catcher.negotiation import negotiate, parse_accept
+
+
+class TestNegotiation:
+
+    @staticmethod
+    def test_parse_accept():
+        assert [("application/json", 1.0), ("application/*", 0.5), ("*/*", 0.0)] == \
+            parse_accept("application/json, application/*;q=0.5, */*;q=nope")
+
+    @staticmethod
+    def test_negotiate():
+        media_types = ("application/json", "application/xml", "application/msgpack")
+        assert "application/xml" == negotiate("application/xml", media_types)
+        assert "application/json" == negotiate("*/*", media_types)
+        assert "application/msgpack" == negotiate("application/*;q=0.2, application/msgpack", media_types)
+        assert "application/xml" == negotiate("application/json;q=0.5, application/xml;q=0.9", media_types)
+        assert "application/xml" == negotiate("*/*, application/json;q=0", media_types)
+        assert negotiate("text/html", media_types) is None
@@ -0,0 +1,86 @@
+import errno
+import re
+
+from aiohttp import web
+
+from aiohttp_catcher import catch, Catcher, ScenarioRegistry
+from aiohttp_catcher.predicates import register, ScenarioIndex
+
+
+class CodedError(Exception):
+    def __init__(self, code: str, *args):
+        super().__init__(*args)
+        self.code = code
+
+
+class TestPredicates:
+
+    @staticmethod
+    def test_index_select():
+        not_found = catch(OSError, errno=errno.ENOENT).with_status_code(404)
+        denied = catch(OSError).where(errno=errno.EACCES).with_status_code(403)
+        disk = catch(OSError, message=re.compile("disk")).with_status_code(507)
+        fallback = catch(OSError).with_status_code(500)
+        index = ScenarioIndex().with_scenario(not_found).with_scenario(denied).with_scenario(disk)
+
+        assert {"errno": {errno.ENOENT: (not_found,), errno.EACCES: (denied,)}} == index.indexed
+        assert (disk,) == index.scanned
+        assert not_found is index.select(FileNotFoundError(errno.ENOENT, "No such file"))
+        assert denied is index.select(OSError(errno.EACCES, "Permission denied"))
+        assert disk is index.select(OSError("Out of disk space"))
+        assert index.select(OSError("Something else")) is None
+        assert fallback is index.with_fallback(fallback).select(OSError("Something else"))
+
+    @staticmethod
+    def test_override_conditional_scenarios():
+        scenario_map = {}
+        not_found = catch(OSError, errno=errno.ENOENT).with_status_code(404)
+        disk = catch(OSError, message=re.compile("disk")).with_status_code(507)
+        assert not register(scenario_map, "builtins.OSError", not_found)
+        assert not register(scenario_map, "builtins.OSError", disk)
+        # Scenarios registered with the same conditions replace the earlier ones:
+        gone = catch(OSError, errno=errno.ENOENT).with_status_code(410)
+        full = catch(OSError, message=disk.conditions["message"]).with_status_code(503)
+        assert register(scenario_map, "builtins.OSError", gone)
+        assert register(scenario_map, "builtins.OSError", full)
+        index = scenario_map["builtins.OSError"]
+        assert {"errno": {errno.ENOENT: (gone,)}} == index.indexed
+        assert (full,) == index.scanned
+        assert gone is index.select(FileNotFoundError(errno.ENOENT, "No such file"))
+
+    @staticmethod
+    async def test_attribute_predicates(aiohttp_client, loop):
+        async def fail(request):
+            code = request.query["code"]
+            if code == "os":
+                raise FileNotFoundError(errno.ENOENT, "No such file")
+            raise CodedError(code, f"Failed with {code}")
+
+        catcher = Catcher()
+        await catcher.add_scenarios(
+            catch(Exception).with_status_code(500).and_return("Generic"),
+            catch(CodedError).with_status_code(400).and_return("Coded"),
+            catch(CodedError, code="QUOTA").with_status_code(429).and_return("Quota"),
+            catch(CodedError, code=lambda code: code.startswith("AUTH")).with_status_code(401).and_stringify(),
+            catch(OSError, errno=errno.ENOENT).with_status_code(404).and_return("No such file"),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/fail", fail)
+
+        client = await aiohttp_client(app)
+        for code, status, message in [("QUOTA", 429, "Quota"), ("AUTH_EXPIRED", 401, "Failed with AUTH_EXPIRED"),
+                                      ("OTHER", 400, "Coded"), ("os", 404, "No such file")]:
+            resp = await client.get(f"/fail?code={code}")
+            assert status == resp.status
+            assert message == (await resp.json()).get("message")
+
+    @staticmethod
+    def test_registry_with_conditions():
+        registry = ScenarioRegistry.build([
+            catch(OSError).with_status_code(500),
+            catch(OSError, errno=errno.ENOENT).with_status_code(404),
+        ])
+        index = registry.scenario_map["builtins.OSError"]
+        assert index.is_index
+        assert 404 == index.select(OSError(errno.ENOENT, "No such file")).status_code
+        assert 500 == index.select(OSError("Something else")).status_code
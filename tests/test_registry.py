@@ -0,0 +1,122 @@
+import json
+import pickle
+import sys
+
+from aiohttp import web
+import pytest
+
+from aiohttp_catcher import catch, Catcher, FrozenScenario, ScenarioRegistry
+from aiohttp_catcher.canned import AIOHTTP_SCENARIO
+from conftest import AppClientError, EntityNotFound
+
+
+class TestScenarioRegistry:
+
+    @staticmethod
+    def test_build_frozen_registry():
+        registry = ScenarioRegistry.build([
+            catch(ZeroDivisionError, IndexError).with_status_code(400).and_return("Bad input"),
+            {"exceptions": [EntityNotFound], "stringify_exception": True, "status_code": 404},
+            AIOHTTP_SCENARIO,
+        ])
+        assert 4 == len(registry)
+        scenario = registry.scenario_map["builtins.ZeroDivisionError"]
+        assert isinstance(scenario, FrozenScenario)
+        assert scenario is registry.scenario_map["builtins.IndexError"]
+        assert (ZeroDivisionError, IndexError) == scenario.exceptions
+        assert not hasattr(scenario, "__dict__")
+        with pytest.raises(AttributeError):
+            scenario.status_code = 500
+        with pytest.raises(TypeError):
+            registry.scenario_map["builtins.KeyError"] = scenario
+        # Subclasses of Scenario keep their behaviour:
+        assert registry.scenario_map["aiohttp.web_exceptions.HTTPException"] is AIOHTTP_SCENARIO
+
+    @staticmethod
+    def test_pickle_registry():
+        registry = ScenarioRegistry.build([
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields({"foo": "bar"}),
+        ])
+        unpickled = pickle.loads(pickle.dumps(registry))
+        scenario = unpickled.scenario_map["conftest.EntityNotFound"]
+        assert 404 == scenario.status_code
+        assert {"foo": "bar"} == scenario.additional_fields
+        assert scenario.stringify_exception
+        with pytest.raises(TypeError):
+            unpickled.scenario_map["builtins.KeyError"] = scenario
+
+    @staticmethod
+    async def test_catcher_with_registry(aiohttp_client, routes, loop):
+        registry = ScenarioRegistry.build([
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+            catch(AppClientError).with_status_code(404).and_stringify(),
+        ])
+        catcher = Catcher(registry=registry)
+        assert catcher.scenario_map is registry.scenario_map
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/divide?a=10&b=0")
+        assert 400 == resp.status
+        assert "Zero division makes zero sense" == (await resp.json()).get("message")
+        resp = await client.get("/user/1009")
+        assert 404 == resp.status
+        assert "User ID 1009 could not be found" == (await resp.json()).get("message")
+
+        # Registering scenarios copies the shared scenario map rather than mutating it:
+        await catcher.add_scenario(catch(IndexError).with_status_code(418))
+        assert catcher.scenario_map is not registry.scenario_map
+        assert "builtins.IndexError" not in registry.scenario_map
+        resp = await client.get("/get-element-n?n=100")
+        assert 418 == resp.status
+
+    @staticmethod
+    def test_load_registry(tmp_path):
+        json_path = tmp_path / "scenarios.json"
+        json_path.write_text(json.dumps({"scenarios": [
+            {"exceptions": ["ZeroDivisionError", "builtins.IndexError"], "constant": "Bad input", "status_code": 400},
+            {"exceptions": ["conftest.EntityNotFound"], "stringify_exception": True, "status_code": 404},
+        ]}))
+        registry = ScenarioRegistry.load(str(json_path))
+        assert 3 == len(registry)
+        assert (ZeroDivisionError, IndexError) == registry.scenario_map["builtins.ZeroDivisionError"].exceptions
+        assert 404 == registry.scenario_map["conftest.EntityNotFound"].status_code
+
+        toml_path = tmp_path / "scenarios.toml"
+        toml_path.write_text(
+            '[[scenarios]]\nexceptions = ["conftest.Forbidden"]\nconstant = "Forbidden"\nstatus_code = 403\n'
+        )
+        pytest.importorskip("tomllib" if sys.version_info >= (3, 11) else "tomli")
+        assert 403 == ScenarioRegistry.load(str(toml_path)).scenario_map["conftest.Forbidden"].status_code
+
+    @staticmethod
+    async def test_reload(aiohttp_client, routes, loop):
+        catcher = Catcher()
+        await catcher.add_scenario(catch(ZeroDivisionError).with_status_code(400).and_return("Zero division"))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+        await catcher.add_scenario(catch(IndexError).with_status_code(418), scope=app)
+        catcher.freeze()
+
+        client = await aiohttp_client(app)
+        assert 400 == (await client.get("/divide?a=10&b=0")).status
+        dispatch = catcher._dispatch
+        catcher.reload([
+            {"exceptions": [ZeroDivisionError], "constant": "Reloaded", "status_code": 422},
+            catch(AppClientError).with_status_code(404).and_stringify(),
+        ])
+        # The previous snapshot is left as it was, for requests still using it:
+        assert "conftest.AppClientError" not in dispatch.scenario_map
+        assert "conftest.AppClientError" in catcher.scenario_map
+        assert 400 == dispatch.scenario_map["builtins.ZeroDivisionError"].status_code
+        assert catcher.frozen
+        with pytest.raises(TypeError):
+            catcher.scenario_map["builtins.KeyError"] = catch(KeyError)
+
+        resp = await client.get("/divide?a=10&b=0")
+        assert 422 == resp.status
+        assert "Reloaded" == (await resp.json()).get("message")
+        assert 404 == (await client.get("/user/1009")).status
+        # Scoped scenarios are kept:
+        assert 418 == (await client.get("/get-element-n?n=100")).status
@@ -0,0 +1,60 @@
+import multiprocessing
+
+from aiohttp import web
+
+from aiohttp_catcher import catch, Catcher, Metrics, SharedErrorStats
+from aiohttp_catcher.shared import OVERFLOW
+from conftest import EntityNotFound
+
+
+def count_errors(stats: SharedErrorStats, errors: int):
+    for _ in range(errors):
+        stats.count("conftest.EntityNotFound", 404)
+    stats.count("unhandled", 500)
+
+
+class TestSharedErrorStats:
+
+    @staticmethod
+    def test_counts_across_forked_workers():
+        stats = SharedErrorStats(slots=8, workers=4)
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=count_errors, args=(stats, errors)) for errors in (1, 2, 3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        stats.count("unhandled", 500)
+        assert {("conftest.EntityNotFound", 404): 6, ("unhandled", 500): 4} == stats.snapshot()
+
+    @staticmethod
+    def test_overflow():
+        stats = SharedErrorStats(slots=3, workers=1)
+        for status in (400, 401, 402, 403):
+            stats.count("scenario", status)
+        stats.count("scenario", 400)
+        assert {("scenario", 400): 2, ("scenario", 401): 1, OVERFLOW: 2} == stats.snapshot()
+
+    @staticmethod
+    async def test_handler(aiohttp_client, routes, loop):
+        stats = SharedErrorStats()
+        metrics = Metrics()
+        catcher = Catcher().add_error_counter(stats.count)
+        # Counting errors doesn't time the error path:
+        assert not catcher.instrumented
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.add_routes(routes)
+        app.router.add_get("/stats", stats.handler)
+
+        client = await aiohttp_client(app)
+        assert 404 == (await client.get("/user/1009")).status
+        # Alongside metrics sinks, too:
+        catcher.use_metrics(metrics)
+        assert 404 == (await client.get("/user/1009")).status
+        resp = await client.get("/stats")
+        assert {
+            "workers": 1,
+            "errors": [{"scenario": "conftest.EntityNotFound", "status": 404, "count": 2}],
+        } == await resp.json()
+        assert {("conftest.EntityNotFound", 404): 1} == metrics.errors
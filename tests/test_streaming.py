@@ -0,0 +1,89 @@
+import json
+
+from aiohttp import ClientPayloadError, web
+import pytest
+
+from aiohttp_catcher import catch, Catcher, Metrics
+from conftest import EntityNotFound
+
+
+def streaming_handler(content_type: str, exc: Exception):
+    async def handler(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        await response.prepare(request)
+        await response.write(b'{"id": 1}\n' if content_type != "text/event-stream" else b"data: 1\n\n")
+        raise exc
+    return handler
+
+
+class TestStreaming:
+
+    @staticmethod
+    async def test_ndjson_error_record(aiohttp_client, loop):
+        catcher = Catcher()
+        await catcher.add_scenarios(
+            catch(EntityNotFound).with_status_code(404).and_stringify().with_additional_fields({"foo": "bar"}),
+            catch(ZeroDivisionError).with_status_code(400).and_return("Zero division makes zero sense"),
+        )
+        app = web.Application(middlewares=[catcher.middleware])
+        app.on_response_prepare.append(catcher.on_response_prepare)
+        app.router.add_get("/export", streaming_handler("application/x-ndjson", EntityNotFound("Entity 2 is gone")))
+        app.router.add_get("/constant", streaming_handler("application/x-ndjson", ZeroDivisionError()))
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/export")
+        assert 200 == resp.status
+        lines = (await resp.text()).splitlines()
+        assert [{"id": 1}, {"message": "Entity 2 is gone", "code": 404, "foo": "bar"}] == [json.loads(line)
+                                                                                          for line in lines]
+        resp = await client.get("/constant")
+        last_line = (await resp.text()).splitlines()[-1]
+        assert {"message": "Zero division makes zero sense", "code": 400} == json.loads(last_line)
+
+    @staticmethod
+    async def test_sse_error_event(aiohttp_client, loop):
+        catcher = Catcher()
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.on_response_prepare.append(catcher.on_response_prepare)
+        app.router.add_get("/events", streaming_handler("text/event-stream", EntityNotFound("Entity 2 is gone")))
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/events")
+        assert 'data: 1\n\nevent: error\ndata: {"message": "Entity 2 is gone", "code": 404}\n\n' == await resp.text()
+
+    @staticmethod
+    async def test_custom_framing_and_unframed_streams(aiohttp_client, loop):
+        catcher = Catcher().add_stream_framing("text/csv", lambda record: b"#error," + record + b"\n")
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.on_response_prepare.append(catcher.on_response_prepare)
+        app.router.add_get("/csv", streaming_handler("text/csv", EntityNotFound("Entity 2 is gone")))
+        app.router.add_get("/binary", streaming_handler("application/octet-stream", EntityNotFound("Gone")))
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/csv")
+        assert (await resp.text()).endswith('#error,{"message": "Entity 2 is gone", "code": 404}\n')
+        # Streams without a framing are aborted:
+        resp = await client.get("/binary")
+        with pytest.raises(ClientPayloadError):
+            await resp.read()
+
+    @staticmethod
+    async def test_observe_streamed_errors(aiohttp_client, loop):
+        metrics = Metrics()
+        phases = []
+        catcher = Catcher().use_metrics(metrics).use_server_timing()
+        catcher.add_phase_hook("resolution", lambda scenario, duration, request: phases.append(scenario))
+        await catcher.add_scenario(catch(EntityNotFound).with_status_code(404).and_stringify())
+        app = web.Application(middlewares=[catcher.middleware])
+        app.on_response_prepare.append(catcher.on_response_prepare)
+        app.router.add_get("/export", streaming_handler("application/x-ndjson", EntityNotFound("Entity 2 is gone")))
+
+        client = await aiohttp_client(app)
+        resp = await client.get("/export")
+        assert {"message": "Entity 2 is gone", "code": 404} == json.loads((await resp.text()).splitlines()[-1])
+        # Errors sent in-band are observed with the scenario's status code; their headers are long gone:
+        assert {("conftest.EntityNotFound", 404): 1} == metrics.errors
+        assert ["conftest.EntityNotFound"] == phases
+        assert "Server-Timing" not in resp.headers
@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from aiohttp import web
+
+from aiohttp_catcher import Catcher, UnhandledExceptionLogger
+from aiohttp_catcher.unhandled import fingerprint
+
+
+def raise_and_catch(exc: Exception) -> Exception:
+    try:
+        raise exc
+    except Exception as e:
+        return e
+
+
+class TestUnhandledExceptionLogger:
+
+    @staticmethod
+    def test_fingerprint_by_type_and_throw_site():
+        first, second = raise_and_catch(KeyError("a")), raise_and_catch(KeyError("b"))
+        assert fingerprint(first) == fingerprint(second)
+        assert fingerprint(first) != fingerprint(raise_and_catch(ValueError("a")))
+        assert (KeyError, "", 0) == fingerprint(KeyError())
+
+    @staticmethod
+    def test_rate_limit_and_summarize(caplog):
+        unhandled_logger = UnhandledExceptionLogger(per_fingerprint_limit=2, global_limit=3,
+                                                    limits={ValueError: 1})
+        with caplog.at_level(logging.INFO, logger="aiohttp_catcher"):
+            assert [True, True, False, False] == [unhandled_logger.log(raise_and_catch(KeyError())) for _ in range(4)]
+            assert [True, False] == [unhandled_logger.log(raise_and_catch(ValueError())) for _ in range(2)]
+            # The global limit has been reached:
+            assert not unhandled_logger.log(raise_and_catch(TypeError()))
+            unhandled_logger.flush()
+
+        errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+        warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+        assert 3 == len(errors)
+        assert all(r.exc_info for r in errors)
+        assert 3 == len(warnings)
+        assert "suppressed 2 occurrences of unhandled builtins.KeyError" in warnings[0]
+        assert unhandled_logger.log(raise_and_catch(KeyError()))
+
+    @staticmethod
+    def test_fingerprint_limits():
+        first = raise_and_catch(KeyError())
+        unhandled_logger = UnhandledExceptionLogger(per_fingerprint_limit=3, limits={fingerprint(first): 1})
+        assert [True, False] == [unhandled_logger.log(first) for _ in range(2)]
+        # Other fingerprints of the same type keep the default limit:
+        assert [True, True] == [unhandled_logger.log(KeyError()) for _ in range(2)]
+
+    @staticmethod
+    async def test_summarize_once_interval_is_over(loop, caplog):
+        unhandled_logger = UnhandledExceptionLogger(per_fingerprint_limit=1, interval=0.05)
+
+        def summaries():
+            return [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+
+        with caplog.at_level(logging.WARNING, logger="aiohttp_catcher"):
+            assert [True, False, False] == [unhandled_logger.log(raise_and_catch(KeyError())) for _ in range(3)]
+            assert not summaries()
+            # Summaries are logged once the interval is over, without waiting for further exceptions:
+            await asyncio.sleep(0.1)
+            assert 1 == len(summaries())
+            assert "suppressed 2 occurrences of unhandled builtins.KeyError" in summaries()[0]
+            assert [True, False] == [unhandled_logger.log(raise_and_catch(KeyError())) for _ in range(2)]
+            # Pending summaries are logged on cleanup:
+            await unhandled_logger.on_cleanup(None)
+            assert 2 == len(summaries())
+
+    @staticmethod
+    async def test_offloaded_logging(aiohttp_client, loop, caplog):
+        async def fail(request):
+            raise KeyError("boom")
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        catcher = Catcher(unhandled_logger=UnhandledExceptionLogger(offload=True, executor=executor))
+        app = web.Application(middlewares=[catcher.middleware])
+        app.router.add_get("/fail", fail)
+        client = await aiohttp_client(app)
+        with caplog.at_level(logging.ERROR, logger="aiohttp_catcher"):
+            resp = await client.get("/fail")
+            assert 500 == resp.status
+            await loop.run_in_executor(executor, lambda: None)
+        assert any(r.exc_info and r.exc_info[0] is KeyError and r.name == "aiohttp_catcher.catcher"
+                   for r in caplog.records)